@@ -1,11 +1,21 @@
+import os
+import glob
+import multiprocessing
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from numpy.lib.stride_tricks import sliding_window_view
+from pandas.api.indexers import BaseIndexer
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from data_collection import collect_race_data
 from feature_sch import FEATURE_NAME
 
 
 CURRENT_YEAR = 2025
+# Bump whenever collect_race_data or the Preprocessor steps change, so cached races are rebuilt
+PIPELINE_VERSION = 1
+FEATURE_CACHE_DIR = "cache/features"
+PREPROCESS_WORKERS = 4
 
 
 class Preprocessor:
@@ -37,9 +47,8 @@ class Preprocessor:
             on='Time',
             direction='nearest'
         )
-        merged_df['TrackTemp_change'] = merged_df.groupby('DriverNumber')['TrackTemp'].diff()
-        merged_df['AirTemp_change'] = merged_df.groupby('DriverNumber')['AirTemp'].diff()
-        merged_df['Humidity_change'] = merged_df.groupby('DriverNumber')['Humidity'].diff()
+        changes = merged_df.groupby('DriverNumber')[['TrackTemp', 'AirTemp', 'Humidity']].diff()
+        merged_df[['TrackTemp_change', 'AirTemp_change', 'Humidity_change']] = changes.to_numpy()
         rainfall_encoder = LabelEncoder()
         merged_df["Rainfall_encoded"] = rainfall_encoder.fit_transform(merged_df["Rainfall"])
         self.encoders["Rainfall"] = rainfall_encoder
@@ -48,73 +57,222 @@ class Preprocessor:
     def create_position_features(self, df):
         df['PositionChange'] = df.groupby('DriverNumber')['Position'].diff()
         df['GapToLeader_seconds'] = pd.to_timedelta(df['LapTime']).dt.total_seconds()
-        df['LapTime_rolling_3'] = df.groupby('DriverNumber')['GapToLeader_seconds'].rolling(3).mean().reset_index(0, drop=True)
-        df['LapTime_rolling_5'] = df.groupby('DriverNumber')['GapToLeader_seconds'].rolling(5).mean().reset_index(0, drop=True)
+        rolling = group_rolling_means(df['GapToLeader_seconds'], df['DriverNumber'], (3, 5))
+        df['LapTime_rolling_3'] = rolling[3]
+        df['LapTime_rolling_5'] = rolling[5]
         return df
 
     def create_strategic_features(self, df):
         df['PitOutLap'] = df['PitOutTime'].notna().astype(int)
         df['PitInLap'] = df['PitInTime'].notna().astype(int)
         df['StintLength'] = df.groupby(['DriverNumber', 'Stint']).cumcount() + 1
-        df['LapsSincePit'] = df.groupby('DriverNumber').apply(
-            lambda x: x['LapNumber'] - x[x['PitOutLap'] == 1]['LapNumber'].shift(1).fillna(0)
-        ).reset_index(0, drop=True)
+        # Set on pit-out laps only: laps since the driver's previous pit-out (or the lap number for the first)
+        pit_out = df['PitOutLap'] == 1
+        previous_pit_out = df.loc[pit_out, 'LapNumber'].groupby(df.loc[pit_out, 'DriverNumber']).shift(1).fillna(0)
+        df['LapsSincePit'] = df['LapNumber'] - previous_pit_out
         return df
 
 
+class GroupWindowIndexer(BaseIndexer):
+    """Trailing windows of window_size rows that stop at the start of each row's group (rows in group order)."""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.group_starts)
+        return start, end
+
+
+def group_rolling_means(values, keys, windows):
+    """Rolling means of values over each key's rows in row order, like groupby(keys).rolling(w).mean().
+
+    Rows are put in group order with one stable sort, so every window size is a single
+    rolling pass over group-bounded windows, the same windows groupby-rolling uses.
+    """
+    codes = keys.groupby(keys, sort=False).ngroup().to_numpy()
+    order = np.argsort(codes, kind="stable")
+    ordered_codes = codes[order]
+    first = np.r_[True, ordered_codes[1:] != ordered_codes[:-1]]
+    group_starts = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    ordered = pd.Series(values.to_numpy(dtype=float)[order])
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    means = {}
+    for window in windows:
+        indexer = GroupWindowIndexer(window_size=window, group_starts=group_starts)
+        mean = ordered.rolling(indexer, min_periods=window).mean().to_numpy()
+        # Rows without a key are left out of every group, as in groupby
+        mean[ordered_codes < 0] = np.nan
+        means[window] = pd.Series(mean[inverse], index=values.index)
+    return means
+
+
 def clean_and_normalize_data(df):
     df = df[df['LapTime'].notna()]
     df['LapTime_seconds'] = pd.to_timedelta(df['LapTime']).dt.total_seconds()
     df = df[(df['LapTime_seconds'] > 60) & (df['LapTime_seconds'] < 120)]
     numeric_columns = df.select_dtypes(include=[np.number]).columns
-    df[numeric_columns] = df[numeric_columns].fillna(df[numeric_columns].median())
+    medians = df[numeric_columns].median()
+    df[numeric_columns] = df[numeric_columns].fillna(medians)
+    # Kept with the trained model, so live rows fill their gaps (early laps' rolling means) the same way
+    fill_values = {name: float(medians[name]) for name in FEATURE_NAME if name in medians and pd.notna(medians[name])}
     scaler = StandardScaler()
     features_to_scale = [
         'LapTime_seconds', 'TrackTemp', 'AirTemp', 'Humidity',
         'TyreAge', 'SpeedI1', 'SpeedI2', 'SpeedFL', 'Position'
     ]
     df[features_to_scale] = scaler.fit_transform(df[features_to_scale])
-    return df, scaler
+    return df, scaler, fill_values
+
+
+class LapWindows:
+    """Sliding windows of consecutive laps, as strided views over one contiguous float32 array.
+
+    Windows never cross a driver's or a race's boundary. Indexing copies only the windows
+    that are asked for, so a batch at a time can be materialized instead of the whole X tensor.
+    """
+
+    def __init__(self, features, targets, starts, sequence_length):
+        self.features = features
+        self.targets = targets
+        self.starts = starts
+        self.sequence_length = sequence_length
+        # (laps - sequence_length + 1, sequence_length, n_features) view, no copy
+        if len(features) >= sequence_length:
+            self.views = sliding_window_view(features, sequence_length, axis=0).transpose(0, 2, 1)
+        else:
+            self.views = np.empty((0, sequence_length, features.shape[1]), dtype=features.dtype)
+
+    @property
+    def shape(self):
+        return (len(self.starts), self.sequence_length, self.features.shape[1])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        return self.views[self.starts[index]]
+
+    def target(self, index):
+        return self.targets[self.starts[index] + self.sequence_length]
+
+    def batches(self, batch_size, start=0, stop=None):
+        """Yield (X, y) batches of the windows between two indices."""
+        stop = len(self) if stop is None else stop
+        for i in range(start, stop, batch_size):
+            j = min(i + batch_size, stop)
+            yield self[i:j], self.target(slice(i, j))
+
+
+def lstm_windows(df, sequence_length=10, target_column='LapTime_seconds', group_columns=('RaceKey', 'DriverNumber')):
+    """Index every window of sequence_length laps followed by a target lap within one driver's race."""
+    group_columns = [column for column in group_columns if column in df.columns]
+    # Races and drivers keep the order they appear in, laps are ordered within each group
+    group_ids = df.groupby(group_columns, sort=False).ngroup().to_numpy()
+    order = np.lexsort((df['LapNumber'].to_numpy(), group_ids))
+    features = np.ascontiguousarray(df[FEATURE_NAME].to_numpy(np.float32)[order])
+    targets = df[target_column].to_numpy(np.float32)[order]
+    group_ids = group_ids[order]
+    # A window starting at i is valid when its target lap i + sequence_length is in the same group
+    starts = np.flatnonzero(group_ids[:-sequence_length] == group_ids[sequence_length:])
+    return LapWindows(features, targets, starts, sequence_length)
 
 
 def create_lstm_sequences(df, sequence_length=10, target_column='LapTime_seconds'):
-    sequences = []
-    targets = []
-    for driver in df['DriverNumber'].unique():
-        driver_data = df[df['DriverNumber'] == driver].sort_values('LapNumber')
-        if len(driver_data) < sequence_length + 1:
-            continue
-        feature_columns = FEATURE_NAME
-        features = driver_data[feature_columns].values
-        for i in range(len(features) - sequence_length):
-            sequences.append(features[i:i + sequence_length])
-            targets.append(features[i + sequence_length][0])  # Predict next lap time
-    return np.array(sequences), np.array(targets)
-
-
-def preprocess_f1_data(years, grand_prix_list, current_year_gp):
+    windows = lstm_windows(df, sequence_length, target_column)
+    return windows[:], windows.target(slice(None))  # Predict next lap time
+
+
+def race_features(year, gp):
+    """Collect one race and run it through the per-race feature pipeline."""
+    race_data, weather, session = collect_race_data(year, gp)
+    preprocessor = Preprocessor()
+    race_data = preprocessor.create_tyre_features(race_data)
+    race_data = preprocessor.create_weather_features(race_data, weather)
+    race_data = preprocessor.create_position_features(race_data)
+    race_data = preprocessor.create_strategic_features(race_data)
+    race_data = preprocessor.create_track_features(race_data)
+    return pd.DataFrame(race_data)
+
+
+def feature_cache_path(year, gp, cache_dir=FEATURE_CACHE_DIR):
+    return os.path.join(cache_dir, f"{year}_{gp:02d}_v{PIPELINE_VERSION}.parquet")
+
+
+def load_cached_features(year, gp, cache_dir=FEATURE_CACHE_DIR):
+    """Features of a race cached by the current pipeline version, or None."""
+    path = feature_cache_path(year, gp, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        print(f"Ignoring unreadable feature cache {path}: {e}")
+        return None
+
+
+def build_race_features(year, gp, cache_dir=FEATURE_CACHE_DIR):
+    """Process pool job: compute the features of a race and cache them on disk."""
+    race_data = race_features(year, gp)
+    path = feature_cache_path(year, gp, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        race_data.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        # Drop what older pipeline versions cached for this race
+        for stale in glob.glob(os.path.join(cache_dir, f"{year}_{gp:02d}_v*.parquet")):
+            if stale != path:
+                os.remove(stale)
+    except Exception as e:
+        print(f"Could not cache features of {year} {gp}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return race_data
+
+
+def preprocess_f1_windows(years, grand_prix_list, current_year_gp, workers=PREPROCESS_WORKERS, cache_dir=FEATURE_CACHE_DIR,
+                          sequence_length=10):
+    """Like preprocess_f1_data, but returns the sequences as LapWindows instead of a materialized X."""
     selected_grand_prixs = []
-    all_data = []
     for year in years:
         for gp in grand_prix_list:
             selected_grand_prixs.append((year, gp))
     for gp in range(1, current_year_gp):
         selected_grand_prixs.append((CURRENT_YEAR, gp))
-    for year, gp in selected_grand_prixs:
-        print(f"Processing {year} {gp}...")
-        try:
-            race_data, weather, session = collect_race_data(year, gp)
-            preprocessor = Preprocessor()
-            race_data = preprocessor.create_tyre_features(race_data)
-            race_data = preprocessor.create_weather_features(race_data, weather)
-            race_data = preprocessor.create_position_features(race_data)
-            race_data = preprocessor.create_strategic_features(race_data)
-            race_data = preprocessor.create_track_features(race_data)
-            all_data.append(race_data)
-        except Exception as e:
-            print(f"Error processing {year} {gp}: {e}")
-            continue
+
+    # Races cached by this pipeline version are read back; only missing or stale ones are computed
+    frames = {}
+    missing = []
+    for race in selected_grand_prixs:
+        cached = load_cached_features(*race, cache_dir)
+        if cached is None:
+            missing.append(race)
+        else:
+            frames[race] = cached
+    print(f"{len(frames)} races cached, processing {len(missing)}...")
+
+    if missing:
+        # training.py has TensorFlow loaded by now; forking that process can deadlock, so spawn clean workers
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context) as executor:
+            futures = {executor.submit(build_race_features, year, gp, cache_dir): (year, gp) for year, gp in missing}
+            for future in as_completed(futures):
+                year, gp = futures[future]
+                try:
+                    frames[(year, gp)] = future.result()
+                    print(f"Processed {year} {gp}")
+                except Exception as e:
+                    print(f"Error processing {year} {gp}: {e}")
+
+    # Keep the chronological race order whatever order the workers finished in
+    all_data = [frames[race].assign(RaceKey=f"{race[0]}_{race[1]:02d}") for race in selected_grand_prixs if race in frames]
     combined_df = pd.concat(all_data, ignore_index=True)
-    processed_df, scaler = clean_and_normalize_data(combined_df)
-    X, y = create_lstm_sequences(processed_df)
-    return X, y, scaler, processed_df
+    processed_df, scaler, fill_values = clean_and_normalize_data(combined_df)
+    return lstm_windows(processed_df, sequence_length), scaler, processed_df, fill_values
+
+
+def preprocess_f1_data(years, grand_prix_list, current_year_gp, workers=PREPROCESS_WORKERS, cache_dir=FEATURE_CACHE_DIR,
+                       sequence_length=10):
+    windows, scaler, processed_df, fill_values = preprocess_f1_windows(years, grand_prix_list, current_year_gp, workers,
+                                                                       cache_dir, sequence_length)
+    return windows[:], windows.target(slice(None)), scaler, processed_df, fill_values
@@ -26,10 +26,12 @@ def build_model(
     model.compile(optimizer=Adam(learning_rate=lr), loss="mse", metrics=["mae", keras.metrics.RootMeanSquaredError("rmse")])  # pyright: ignore
     return model
 
+def split_bounds(n, train_ratio=0.7, val_ratio=0.15):
+    """End indices of the train and validation blocks of n chronologically ordered samples."""
+    return int(n * train_ratio), int(n * (train_ratio + val_ratio))
+
 def chronological_splits(X, y, train_ratio=0.7, val_ratio=0.15):
-    n = len(X)
-    train_end = int(n * train_ratio)
-    val_end = int(n * (train_ratio + val_ratio))
+    train_end, val_end = split_bounds(len(X), train_ratio, val_ratio)
     X_train, y_train = X[:train_end], y[:train_end]
     X_val, y_val = X[train_end:val_end], y[train_end:val_end]
     X_test, y_test = X[val_end:], y[val_end:]
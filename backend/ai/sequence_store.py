@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import joblib
+import numpy as np
+from numpy.lib.format import open_memmap
+from feature_engineering import PIPELINE_VERSION
+from feature_sch import FEATURE_NAME
+
+
+SEQUENCE_STORE_DIR = "cache/sequences"
+# Windows copied from the lap features into the store at a time
+WRITE_BATCH = 4096
+# Everything a store directory holds; only these files are ever replaced
+STORE_FILES = ("meta.json", "X.npy", "y.npy", "scaler.joblib")
+
+
+def store_key(years, gps, current_year, timesteps):
+    """Everything the stored sequences depend on; a store is reused only when this matches."""
+    return {
+        "years": list(years),
+        "gps": list(gps),
+        "current_year": current_year,
+        "timesteps": timesteps,
+        "pipeline_version": PIPELINE_VERSION,
+        "features": FEATURE_NAME,
+    }
+
+
+def default_store_dir(key, root=SEQUENCE_STORE_DIR):
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(root, digest)
+
+
+class SequenceStore:
+    """Preprocessed LSTM sequences on disk: X.npy and y.npy opened as read-only memmaps.
+
+    meta.json is written last, so a store without it (an interrupted write) is never reused.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+        self.y = np.load(os.path.join(path, "y.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.y)
+
+    def batches(self, start, stop, batch_size, rng=None):
+        """Yield (X, y) batches of samples start..stop read from the memmaps.
+
+        With an rng the samples are shuffled across the whole block (like fit(shuffle=True)),
+        each batch being read in file order.
+        """
+        if rng is None:
+            for i in range(start, stop, batch_size):
+                j = min(i + batch_size, stop)
+                yield np.asarray(self.X[i:j]), np.asarray(self.y[i:j])
+            return
+        order = rng.permutation(np.arange(start, stop))
+        for i in range(0, len(order), batch_size):
+            index = np.sort(order[i:i + batch_size])
+            yield self.X[index], self.y[index]
+
+    @property
+    def scaler(self):
+        return joblib.load(os.path.join(self.path, "scaler.joblib"))
+
+    @property
+    def fill_values(self):
+        """Training medians that filled missing feature values, by column."""
+        return self.meta["fill_values"]
+
+
+def open_sequence_store(path, key):
+    """The store at a path if it is complete and was built for the same key, else None."""
+    try:
+        store = SequenceStore(path)
+    except (OSError, ValueError):
+        return None
+    if store.meta.get("key") != key or store.meta.get("count") != len(store):
+        return None
+    if "fill_values" not in store.meta:  # written before the fill values were recorded
+        return None
+    return store
+
+
+def check_store_dir(path):
+    """Refuse a directory that already holds anything but a (possibly outdated) store."""
+    if not os.path.isdir(path):
+        return
+    other = sorted(set(os.listdir(path)) - set(STORE_FILES))
+    if other:
+        raise FileExistsError(f"{path} is not a sequence store (it holds {', '.join(other[:3])}), "
+                              "pick another --sequence_store directory")
+
+
+def write_sequence_store(path, windows, scaler, key, fill_values):
+    """Copy every window of a LapWindows into a memory-mapped store, one batch at a time."""
+    check_store_dir(path)
+    if os.path.isdir(path):
+        # meta.json goes first, so an interrupted rewrite is never taken for a complete store
+        for name in STORE_FILES:
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+    os.makedirs(path, exist_ok=True)
+    X = open_memmap(os.path.join(path, "X.npy"), mode="w+", dtype=np.float32, shape=windows.shape)
+    y = open_memmap(os.path.join(path, "y.npy"), mode="w+", dtype=np.float32, shape=(len(windows),))
+    for i, (X_batch, y_batch) in zip(range(0, len(windows), WRITE_BATCH), windows.batches(WRITE_BATCH)):
+        X[i:i + len(X_batch)] = X_batch
+        y[i:i + len(y_batch)] = y_batch
+    X.flush()
+    y.flush()
+    del X, y
+
+    joblib.dump(scaler, os.path.join(path, "scaler.joblib"))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"key": key, "count": len(windows), "shape": list(windows.shape), "fill_values": fill_values}, f,
+                  indent=2)
+    return SequenceStore(path)
@@ -8,8 +8,10 @@ import datetime
 from pathlib import Path
 from keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCheckpoint, CSVLogger
 
-from models import chronological_splits, build_model
-from feature_engineering import preprocess_f1_data
+from models import split_bounds, build_model
+from feature_engineering import preprocess_f1_windows, PREPROCESS_WORKERS, FEATURE_CACHE_DIR
+from feature_sch import FEATURE_NAME
+from sequence_store import store_key, default_store_dir, check_store_dir, open_sequence_store, write_sequence_store
 
 
 SEED = 42
@@ -18,6 +20,20 @@ np.random.seed(SEED)
 tf.random.set_seed(SEED)
 
 
+def make_dataset(store, start, stop, batch_size, shuffle=False):
+    """tf.data pipeline streaming batches of a block of the sequence store, read ahead while training."""
+    timesteps, n_features = store.X.shape[1], store.X.shape[2]
+    rng = np.random.default_rng(SEED) if shuffle else None
+    dataset = tf.data.Dataset.from_generator(
+        lambda: store.batches(start, stop, batch_size, rng),
+        output_signature=(
+            tf.TensorSpec(shape=(None, timesteps, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
 def train():
     parser = argparse.ArgumentParser(description="Train LSTM for F1 lap prediction")
     parser.add_argument("--years", nargs="+", type=int, default=[2018, 2019, 2020, 2021, 2022, 2023, 2024], help="Seasons to include")
@@ -31,19 +47,36 @@ def train():
     parser.add_argument("--units2", type=int, default=64, help="Second LSTM layer units")
     parser.add_argument("--dropout", type=float, default=0.2, help="Dropout rate")
     parser.add_argument("--artifacts_dir", type=str, default="artifacts", help="Where to save the model and logs")
+    parser.add_argument("--workers", type=int, default=PREPROCESS_WORKERS, help="Processes computing race features in parallel")
+    parser.add_argument("--feature_cache", type=str, default=FEATURE_CACHE_DIR, help="Where per-race features are cached")
+    parser.add_argument("--sequence_store", type=str, default=None, help="Directory of the memory-mapped sequences (default: derived from the data arguments)")
     args = parser.parse_args()
 
     ts = datetime.datetime.now(datetime.UTC).strftime("%Y%m%d-%H%M%S")
     run_dir = Path(args.artifacts_dir) / f"lstm_run_{ts}"
     run_dir.mkdir(parents=True, exist_ok=True)
 
-    print("Preprocessing data...")
-    X, y, scaler, df = preprocess_f1_data(args.years, args.gps, args.current_year)
-    print(f"Data ready: X={X.shape}, y={y.shape}")
-
-    (X_train, y_train), (X_val, y_val), (X_test, y_test) = chronological_splits(X, y)
-
-    timesteps, n_features = X_train.shape[1], X_train.shape[2]
+    key = store_key(args.years, args.gps, args.current_year, args.timesteps)
+    store_dir = args.sequence_store or default_store_dir(key)
+    store = open_sequence_store(store_dir, key)
+    if store is None:
+        # Fail before preprocessing rather than after it
+        check_store_dir(store_dir)
+        print("Preprocessing data...")
+        windows, scaler, df, fill_values = preprocess_f1_windows(args.years, args.gps, args.current_year, args.workers, args.feature_cache, args.timesteps)
+        store = write_sequence_store(store_dir, windows, scaler, key, fill_values)
+        del windows, df
+    else:
+        print(f"Reusing preprocessed sequences in {store_dir}")
+        scaler = store.scaler
+    print(f"Data ready: X={store.X.shape}, y={store.y.shape}")
+
+    train_end, val_end = split_bounds(len(store))
+    train_ds = make_dataset(store, 0, train_end, args.batch_size, shuffle=True)
+    val_ds = make_dataset(store, train_end, val_end, args.batch_size)
+    test_ds = make_dataset(store, val_end, len(store), args.batch_size)
+
+    timesteps, n_features = store.X.shape[1], store.X.shape[2]
     model = build_model(
         input_shape=(timesteps, n_features),
         units1=args.units1,
@@ -63,16 +96,15 @@ def train():
 
     #training sigma model
     model.fit(
-        X_train, y_train,
-        validation_data=(X_val, y_val),
-        batch_size=args.batch_size,
+        train_ds,
+        validation_data=val_ds,
         epochs=args.epochs,
         callbacks=callbacks,
         verbose=1, # pyright: ignore
     )
 
     print("Evaluating best model on test set...")
-    test_metrics = model.evaluate(X_test, y_test)
+    test_metrics = model.evaluate(test_ds)
     metric_names = model.metrics_names
     test_results = {name: float(val) for name, val in zip(metric_names, test_metrics)}
     print("Test metrics:", test_results)
@@ -87,6 +119,10 @@ def train():
         print("Warning: could not save scaler:", e)
 
     config = vars(args)
+    # Input column order of the model, read back by the live lap time predictor
+    config["features"] = FEATURE_NAME
+    # Medians that filled the training data's missing values, applied to live rows before scaling
+    config["fill_values"] = store.fill_values
     with open(run_dir / "config.json", "w") as f:
         json.dump(config, f, indent=2)
     with open(run_dir / "test_metrics.json", "w") as f:
@@ -0,0 +1,72 @@
+"""Per-tick CPU of the broadcast hub against per-client serialization for 1-500 clients.
+
+Run from the backend directory: python -m benchmarks.bench_broadcast [feed file]
+"""
+import sys
+import json
+import time
+from util.Livetiming import RaceData, parse_message
+from util.broadcast import Channel
+from util.feed import iter_messages
+from util.history import MessageHistory
+
+CLIENT_COUNTS = [1, 10, 50, 100, 250, 500]
+MESSAGES_PER_TICK = 20
+TICKS = 200
+
+
+def load_messages(path):
+    return [parse_message(msg) for msg in iter_messages(path)]
+
+
+def feed(race_data, history, messages):
+    for msg in messages:
+        history.append(msg)
+        race_data.update_from_message(msg["Title"], msg["Data"], msg.get("Timestamp"))
+
+
+def run_hub(messages, clients):
+    history = MessageHistory()
+    race_data = RaceData(history)
+    channel = Channel(race_data, history, queue_size=TICKS + 1)
+    subscribers = [channel.subscribe("patch") for _ in range(clients)]
+    cpu = 0.0
+    for tick in range(TICKS):
+        feed(race_data, history, messages[tick * MESSAGES_PER_TICK:(tick + 1) * MESSAGES_PER_TICK])
+        start = time.process_time()
+        channel.tick()
+        cpu += time.process_time() - start
+        for subscriber in subscribers:
+            subscriber.drain()
+    return cpu / TICKS
+
+
+def run_per_client(messages, clients):
+    history = MessageHistory()
+    race_data = RaceData(history)
+    versions = [race_data.version] * clients
+    cpu = 0.0
+    for tick in range(TICKS):
+        feed(race_data, history, messages[tick * MESSAGES_PER_TICK:(tick + 1) * MESSAGES_PER_TICK])
+        start = time.process_time()
+        for idx in range(clients):
+            json.dumps(race_data.build_patch(versions[idx]))
+            versions[idx] = race_data.version
+        cpu += time.process_time() - start
+    return cpu / TICKS
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "fake_saved_data.txt"
+    messages = load_messages(path)
+    # Skip the quiet pre-session part of the feed so every tick carries timing updates
+    messages = [msg for msg in messages if msg.get("Title") != "Heartbeat"]
+    print(f"{'clients':>8} {'hub ms/tick':>12} {'per-client ms/tick':>20}")
+    for clients in CLIENT_COUNTS:
+        hub_cpu = run_hub(messages, clients)
+        per_client_cpu = run_per_client(messages, clients)
+        print(f"{clients:>8} {hub_cpu * 1000:>12.3f} {per_client_cpu * 1000:>20.3f}")
+
+
+if __name__ == "__main__":
+    main()
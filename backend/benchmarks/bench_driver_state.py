@@ -0,0 +1,164 @@
+"""Replays every TimingData message of a race through the old dict-of-dicts driver store and DriverState.
+
+"baseline" is the dict store exactly as it was before change tracking; "dict store" is the same
+store with the per-path bookkeeping patch clients need, which DriverState has to do as well.
+
+Run from the backend directory: python -m benchmarks.bench_driver_state [feed file]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from util.feed import iter_messages
+from util.Livetiming import RaceData, parse_message
+
+REPEATS = 15
+
+
+class BaselineRaceData(RaceData):
+    """The original driver store, without recording changed paths."""
+
+    def get_driver_state(self, car_number):
+        if car_number not in self.drivers:
+            self.drivers[car_number] = {
+                "car_number": car_number, "position": None, "line": None, "last_lap_time": None,
+                "best_lap_time": None, "gap_to_leader": None, "interval_to_ahead": None,
+                "number_of_laps": 0, "in_pit": False, "status": None,
+                "sectors": {
+                    "0": {"value": None, "segments": {}},
+                    "1": {"value": None, "segments": {}},
+                    "2": {"value": None, "segments": {}}
+                },
+                "speeds": {}, "personal_fastest": False, "catching": None, "stints": {}
+            }
+        return self.drivers[car_number]
+
+    def _update_timing_data(self, data):
+        if "Lines" not in data:
+            return
+        for car_number, driver_data in data["Lines"].items():
+            driver_state = self.get_driver_state(car_number)
+            if "Position" in driver_data:
+                driver_state["position"] = driver_data["Position"]
+            if "Line" in driver_data:
+                driver_state["line"] = driver_data["Line"]
+            if "LastLapTime" in driver_data:
+                if isinstance(driver_data["LastLapTime"], dict):
+                    driver_state["last_lap_time"] = driver_data["LastLapTime"]
+                else:
+                    driver_state["last_lap_time"] = {"Value": driver_data["LastLapTime"]}
+            if "BestLapTime" in driver_data:
+                driver_state["best_lap_time"] = driver_data["BestLapTime"]
+            if "GapToLeader" in driver_data:
+                driver_state["gap_to_leader"] = driver_data["GapToLeader"]
+            if "IntervalToPositionAhead" in driver_data:
+                driver_state["interval_to_ahead"] = driver_data["IntervalToPositionAhead"]
+            if "NumberOfLaps" in driver_data:
+                driver_state["number_of_laps"] = driver_data["NumberOfLaps"]
+            if "InPit" in driver_data:
+                driver_state["in_pit"] = driver_data["InPit"]
+            if "Status" in driver_data:
+                driver_state["status"] = driver_data["Status"]
+            if "Sectors" in driver_data:
+                for sector_num, sector_data in driver_data["Sectors"].items():
+                    if sector_num in driver_state["sectors"]:
+                        if "Value" in sector_data:
+                            driver_state["sectors"][sector_num]["value"] = sector_data["Value"]
+                        if "Segments" in sector_data:
+                            driver_state["sectors"][sector_num]["segments"] = sector_data["Segments"]
+            if "Speeds" in driver_data:
+                driver_state["speeds"].update(driver_data["Speeds"])
+
+
+class DictRaceData(RaceData):
+    """The dict store with change tracking: one nested dict per car, updated through a chain of `in` checks."""
+
+    def get_driver_state(self, car_number):
+        if car_number not in self.drivers:
+            self._touch("drivers", car_number)
+            self.drivers[car_number] = {
+                "car_number": car_number, "position": None, "line": None, "last_lap_time": None,
+                "best_lap_time": None, "gap_to_leader": None, "interval_to_ahead": None,
+                "number_of_laps": 0, "in_pit": False, "status": None,
+                "sectors": {
+                    "0": {"value": None, "segments": {}},
+                    "1": {"value": None, "segments": {}},
+                    "2": {"value": None, "segments": {}}
+                },
+                "speeds": {}, "personal_fastest": False, "catching": None, "stints": {}
+            }
+        return self.drivers[car_number]
+
+    def _update_timing_data(self, data):
+        if "Lines" not in data:
+            return
+        for car_number, driver_data in data["Lines"].items():
+            driver_state = self.get_driver_state(car_number)
+            for key, field in (("Position", "position"), ("Line", "line")):
+                if key in driver_data:
+                    driver_state[field] = driver_data[key]
+                    self._touch("drivers", car_number, field)
+            if "LastLapTime" in driver_data:
+                if isinstance(driver_data["LastLapTime"], dict):
+                    driver_state["last_lap_time"] = driver_data["LastLapTime"]
+                else:
+                    driver_state["last_lap_time"] = {"Value": driver_data["LastLapTime"]}
+                self._touch("drivers", car_number, "last_lap_time")
+            for key, field in (("BestLapTime", "best_lap_time"), ("GapToLeader", "gap_to_leader"),
+                               ("IntervalToPositionAhead", "interval_to_ahead"), ("NumberOfLaps", "number_of_laps"),
+                               ("InPit", "in_pit"), ("Status", "status")):
+                if key in driver_data:
+                    driver_state[field] = driver_data[key]
+                    self._touch("drivers", car_number, field)
+            if "Sectors" in driver_data:
+                for sector_num, sector_data in driver_data["Sectors"].items():
+                    if sector_num in driver_state["sectors"]:
+                        if "Value" in sector_data:
+                            driver_state["sectors"][sector_num]["value"] = sector_data["Value"]
+                            self._touch("drivers", car_number, "sectors", sector_num, "value")
+                        if "Segments" in sector_data:
+                            driver_state["sectors"][sector_num]["segments"] = sector_data["Segments"]
+                            self._touch("drivers", car_number, "sectors", sector_num, "segments")
+            if "Speeds" in driver_data:
+                driver_state["speeds"].update(driver_data["Speeds"])
+                for speed_type in driver_data["Speeds"]:
+                    self._touch("drivers", car_number, "speeds", speed_type)
+
+
+def replay(store_cls, messages):
+    best = float("inf")
+    for _ in range(REPEATS):
+        store = store_cls()
+        gc.collect()
+        start = time.perf_counter()
+        for msg in messages:
+            store.update_from_message("TimingData", msg["Data"], msg["Timestamp"])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def driver_memory(store_cls, messages):
+    """Bytes allocated for driver records, excluding the message payloads they reference."""
+    store = store_cls()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for car_number in {car for msg in messages for car in msg["Data"].get("Lines", {})}:
+        store.get_driver_state(car_number)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "fake_saved_data.txt"
+    messages = [parse_message(msg) for msg in iter_messages(path)]
+    messages = [msg for msg in messages if msg.get("Title") == "TimingData"]
+    print(f"{len(messages)} TimingData messages from {path}")
+    for name, store_cls in (("baseline", BaselineRaceData), ("dict store", DictRaceData), ("DriverState", RaceData)):
+        seconds = replay(store_cls, messages)
+        print(f"{name:<12} {seconds * 1000:8.1f} ms  {seconds / len(messages) * 1e6:6.2f} us/msg  "
+              f"{driver_memory(store_cls, messages):>8,} bytes of driver records")
+
+
+if __name__ == "__main__":
+    main()
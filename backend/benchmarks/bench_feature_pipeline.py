@@ -0,0 +1,96 @@
+"""Position and strategic lap features: the previous groupby-apply / per-window-size rolling
+implementations against the vectorized Preprocessor, checked for identical output.
+
+Run from the backend directory: python -m benchmarks.bench_feature_pipeline [seasons]
+The frame is generated: 24 races per season, 20 cars, 60 laps, two or three stops per car.
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+from benchmarks.bench_gap_to_leader import timed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai"))
+from feature_engineering import Preprocessor  # noqa: E402
+
+
+def position_features_apply(df):
+    """The previous create_position_features."""
+    df['PositionChange'] = df.groupby('DriverNumber')['Position'].diff()
+    df['GapToLeader_seconds'] = pd.to_timedelta(df['LapTime']).dt.total_seconds()
+    df['LapTime_rolling_3'] = df.groupby('DriverNumber')['GapToLeader_seconds'].rolling(3).mean().reset_index(0, drop=True)
+    df['LapTime_rolling_5'] = df.groupby('DriverNumber')['GapToLeader_seconds'].rolling(5).mean().reset_index(0, drop=True)
+    return df
+
+
+def strategic_features_apply(df):
+    """The previous create_strategic_features."""
+    df['PitOutLap'] = df['PitOutTime'].notna().astype(int)
+    df['PitInLap'] = df['PitInTime'].notna().astype(int)
+    df['StintLength'] = df.groupby(['DriverNumber', 'Stint']).cumcount() + 1
+    df['LapsSincePit'] = df.groupby('DriverNumber').apply(
+        lambda x: x['LapNumber'] - x[x['PitOutLap'] == 1]['LapNumber'].shift(1).fillna(0)
+    ).reset_index(0, drop=True)
+    return df
+
+
+def synthetic_seasons(seasons=7, races=24, cars=20, laps=60, seed=0):
+    """Race frames concatenated like preprocess_f1_data does, rows in merge_asof (time) order."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(seasons * races):
+        car = np.repeat(np.arange(cars), laps)
+        lap = np.tile(np.arange(1, laps + 1), cars).astype(float)
+        stops = np.sort(rng.integers(8, laps - 5, size=(cars, 3)), axis=1)
+        stops[rng.random(cars) < 0.5, 2] = laps + 1  # half the field stops twice only
+        stint = 1 + (lap[:, None] > stops[car]).sum(axis=1)
+        lap_time = rng.normal(82.0, 0.8, size=len(lap))
+        lap_time[rng.random(len(lap)) < 0.02] = np.nan  # deleted / missing laps
+        pit_out = (lap[:, None] == stops[car] + 1).any(axis=1)
+        pit_in = (lap[:, None] == stops[car]).any(axis=1)
+        frame = pd.DataFrame({
+            "DriverNumber": (car + 1).astype(str),
+            "LapNumber": lap,
+            "Stint": stint.astype(float),
+            "Position": rng.integers(1, cars + 1, size=len(lap)).astype(float),
+            "LapTime": pd.to_timedelta(lap_time, unit="s"),
+            "PitOutTime": pd.to_timedelta(np.where(pit_out, 3600.0 + lap * 82, np.nan), unit="s"),
+            "PitInTime": pd.to_timedelta(np.where(pit_in, 3600.0 + lap * 82, np.nan), unit="s"),
+            "Time": lap * 82.0 + rng.random(len(lap)),
+        })
+        frames.append(frame.sort_values("Time", ignore_index=True))
+    return frames
+
+
+def run_pipeline(frames, position_features, strategic_features):
+    return [strategic_features(position_features(frame.copy())) for frame in frames]
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    seasons = int(args[0]) if args else 7
+    frames = synthetic_seasons(seasons)
+    print(f"{seasons} seasons, {len(frames)} races, {sum(len(frame) for frame in frames)} laps")
+
+    preprocessor = Preprocessor()
+    expected, apply_seconds = timed(lambda: run_pipeline(frames, position_features_apply, strategic_features_apply))
+    result, vector_seconds = timed(lambda: run_pipeline(
+        frames, preprocessor.create_position_features, preprocessor.create_strategic_features))
+    for got, want in zip(result, expected):
+        pd.testing.assert_frame_equal(got, want, check_exact=True)
+
+    # One multi-season frame as well, so groups span thousands of rows
+    combined = pd.concat(frames, ignore_index=True)
+    expected, combined_apply = timed(lambda: strategic_features_apply(position_features_apply(combined.copy())))
+    result, combined_vector = timed(lambda: preprocessor.create_strategic_features(
+        preprocessor.create_position_features(combined.copy())))
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+    print(f"per race      groupby-apply {apply_seconds:>7.2f} s   vectorized {vector_seconds:>7.2f} s"
+          f"  ({apply_seconds / vector_seconds:.1f}x)")
+    print(f"one frame     groupby-apply {combined_apply:>7.2f} s   vectorized {combined_vector:>7.2f} s"
+          f"  ({combined_apply / combined_vector:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Lines per second of the feed decoder and the binary journal against ast.literal_eval.
+
+Run from the backend directory: python -m benchmarks.bench_feed_decode [feed file]
+"""
+import gc
+import os
+import ast
+import sys
+import time
+import tempfile
+from util import feed
+
+
+def rate(count, seconds):
+    return f"{count / seconds:>12,.0f} lines/s"
+
+
+def timed(fn):
+    """Run fn with the cyclic GC paused, like timeit, so collections of earlier results do not skew it."""
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "fake_saved_data.txt"
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    print(f"{len(lines)} lines from {path}")
+
+    expected, seconds = timed(lambda: [ast.literal_eval(line.strip()) for line in lines])
+    print(f"ast.literal_eval  {rate(len(lines), seconds)}")
+
+    decoded, seconds = timed(lambda: [feed.decode_line(line) for line in lines])
+    print(f"decode_line       {rate(len(lines), seconds)}")
+    assert decoded == expected, "decode_line disagrees with ast.literal_eval"
+
+    if feed.msgpack is None:
+        print("binary journal    skipped (msgpack not installed)")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = os.path.join(tmp, "feed.f1j")
+        feed.convert_to_journal(path, journal)
+        replayed, seconds = timed(lambda: list(feed.iter_messages(journal)))
+        print(f"binary journal    {rate(len(lines), seconds)}")
+        assert replayed == expected, "journal disagrees with the text feed"
+        print(f"size: text {os.path.getsize(path):,} bytes, journal {os.path.getsize(journal):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Gap-to-leader computation on a full race: the old per-lap loop against the vectorized version.
+
+Run from the backend directory: python -m benchmarks.bench_gap_to_leader [year gp]
+Without arguments the 2024 Hungarian GP (70 laps) is loaded through FastF1; pass --synthetic
+to use a generated 20-car, 70-lap race instead.
+"""
+import gc
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from util.Fetchpastrace import gap_to_leader_process
+
+REPEATS = 5
+
+
+def timed(fn):
+    """Best wall time of fn over REPEATS runs with the cyclic GC paused."""
+    gc.collect()
+    gc.disable()
+    try:
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - start)
+        return result, best
+    finally:
+        gc.enable()
+
+
+def gap_to_leader_loop(laps, drivers, total_lap):
+    """The previous implementation, minus its write to the caller's frame."""
+    lap1 = True
+    out = pd.Series()
+    for idx in range(total_lap):
+        lap = laps[laps["LapNumber"] == idx]
+        if lap1:
+            lap1 = False
+            continue
+        out = out.combine_first(lap.loc[:, "LapStartTime"] - lap.loc[lap["Position"] == 1, "LapStartTime"].to_list()[0])
+    out.name = "GapToLeader"
+    return out
+
+
+def synthetic_race(cars=20, total_lap=70, seed=0):
+    """Laps frame with the columns the session endpoints use, one pit stop per car."""
+    rng = np.random.default_rng(seed)
+    lap_times = rng.normal(80.0, 0.6, size=(cars, total_lap))
+    start_times = 3600.0 + np.cumsum(lap_times, axis=1) - lap_times
+    pit_laps = rng.integers(15, 50, size=cars)
+    rows = []
+    for lap in range(total_lap):
+        order = np.argsort(start_times[:, lap])
+        for position, car in enumerate(order, start=1):
+            start, lap_time = start_times[car, lap], lap_times[car, lap]
+            pit_in = pd.Timedelta(seconds=start + lap_time) if lap + 1 == pit_laps[car] else pd.NaT
+            pit_out = pd.Timedelta(seconds=start + 2.0) if lap == pit_laps[car] else pd.NaT
+            stint_start = 0 if lap < pit_laps[car] else pit_laps[car]
+            rows.append({
+                "DriverNumber": str(car + 1),
+                "LapNumber": float(lap + 1),
+                "LapStartTime": pd.Timedelta(seconds=start),
+                "Time": pd.Timedelta(seconds=start + lap_time),
+                "LapTime": pd.Timedelta(seconds=lap_time) if lap else pd.NaT,
+                "Sector1Time": pd.Timedelta(seconds=lap_time * 0.3),
+                "Sector2Time": pd.Timedelta(seconds=lap_time * 0.4),
+                "Sector3Time": pd.Timedelta(seconds=lap_time * 0.3),
+                "PitInTime": pit_in,
+                "PitOutTime": pit_out,
+                "Compound": "MEDIUM" if lap < pit_laps[car] else "HARD",
+                "TyreLife": float(lap - stint_start + 1),
+                "TrackStatus": "1",
+                "Position": float(position),
+                "Deleted": False
+            })
+    laps = pd.DataFrame(rows).sort_values(["DriverNumber", "LapNumber"], ignore_index=True)
+    return laps, [str(car + 1) for car in range(cars)], total_lap
+
+
+def real_race(year, gp):
+    from util.races import get_session
+    session = get_session(year, gp, "r")
+    return session.laps, session.drivers, session.total_laps
+
+
+def main():
+    if "--synthetic" in sys.argv:
+        laps, drivers, total_lap = synthetic_race()
+    else:
+        args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        year, gp = (int(args[0]), args[1]) if len(args) >= 2 else (2024, "Hungary")
+        laps, drivers, total_lap = real_race(year, gp)
+    print(f"{len(laps)} laps, {len(drivers)} drivers, {total_lap} race laps")
+
+    columns = list(laps.columns)
+    with warnings.catch_warnings():
+        # The old loop trips pandas' empty-concat deprecation on its first combine_first
+        warnings.simplefilter("ignore", FutureWarning)
+        expected, loop_seconds = timed(lambda: gap_to_leader_loop(laps, drivers, total_lap))
+    result, vector_seconds = timed(lambda: gap_to_leader_process(laps, drivers, total_lap))
+    assert list(laps.columns) == columns, "gap_to_leader_process modified its input"
+    pd.testing.assert_series_equal(result.sort_index(), expected.sort_index(), check_dtype=False)
+
+    print(f"per-lap loop   {loop_seconds * 1000:>9.2f} ms")
+    print(f"vectorized     {vector_seconds * 1000:>9.2f} ms  ({loop_seconds / vector_seconds:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Response building for /session/laptimes: the old per-driver masks against the single groupby pass.
+
+Run from the backend directory: python -m benchmarks.bench_laptime_process [year gp] [--synthetic]
+Uses the same race as bench_gap_to_leader.
+"""
+import sys
+import json
+import warnings
+import pandas as pd
+from util.Fetchpastrace import laptime_process, laptime_time_selections, laptime_var_selections
+from benchmarks.bench_gap_to_leader import gap_to_leader_loop, real_race, synthetic_race, timed
+
+
+def laptime_process_masks(laps, drivers, total_lap, is_race):
+    """The previous implementation, with the old gap-to-leader loop."""
+    out = {}
+    lap_copy = laps.copy()
+    lap_out = laps[laptime_var_selections]
+    time_copy = lap_copy[laptime_time_selections]
+    tem = []
+    for time_selection in laptime_time_selections:
+        tem.append(time_copy[time_selection].dt.total_seconds())
+    time_out = pd.DataFrame(tem).T
+    if is_race:
+        lap_copy = pd.concat([time_out, lap_out, gap_to_leader_loop(laps, drivers, total_lap).dt.total_seconds()], axis=1)
+    else:
+        lap_copy = pd.concat([time_out, lap_out], axis=1)
+    for driver in drivers:
+        out[driver] = lap_copy.loc[lap_copy["DriverNumber"] == driver]
+        out[driver].set_index("LapNumber", inplace=True)
+        out[driver] = out[driver].to_dict()
+    return out
+
+
+def main():
+    if "--synthetic" in sys.argv:
+        laps, drivers, total_lap = synthetic_race()
+    else:
+        args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        year, gp = (int(args[0]), args[1]) if len(args) >= 2 else (2024, "Hungary")
+        laps, drivers, total_lap = real_race(year, gp)
+    print(f"{len(laps)} laps, {len(drivers)} drivers")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        expected, old_seconds = timed(lambda: json.dumps(laptime_process_masks(laps, drivers, total_lap, True)))
+    payload, new_seconds = timed(lambda: json.dumps(laptime_process(laps, drivers, total_lap, True)))
+    columnar, columnar_seconds = timed(lambda: json.dumps(laptime_process(laps, drivers, total_lap, True, columnar=True)))
+    assert payload == expected, "laptime_process output changed"
+
+    print(f"{'':16} {'ms':>9} {'bytes':>12}")
+    print(f"{'per-driver mask':16} {old_seconds * 1000:>9.2f} {len(expected):>12,}")
+    print(f"{'groupby':16} {new_seconds * 1000:>9.2f} {len(payload):>12,}")
+    print(f"{'columnar':16} {columnar_seconds * 1000:>9.2f} {len(columnar):>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Size and encode time of /session/laptimes and /session/weatherdata bodies on a full race.
+
+Compares the old body (json.dumps output serialized again as a JSON string) with plain JSON,
+columnar JSON and the binary columnar msgpack format.
+
+Run from the backend directory: python -m benchmarks.bench_session_formats [year gp] [--synthetic]
+"""
+import sys
+import json
+import numpy as np
+import pandas as pd
+from util.Fetchpastrace import laptime_process, weather_process
+from util.encoding import encode_columns, encode_json
+from benchmarks.bench_gap_to_leader import real_race, synthetic_race, timed
+
+
+def synthetic_weather(samples=150, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "Time": np.arange(samples) * 60.0,
+        "AirTemp": 27 + rng.normal(0, 0.3, samples),
+        "Humidity": 45 + rng.normal(0, 1, samples),
+        "Pressure": 1012 + rng.normal(0, 0.2, samples),
+        "Rainfall": np.zeros(samples, dtype=bool),
+        "TrackTemp": 44 + rng.normal(0, 0.5, samples),
+        "WindDirection": rng.integers(0, 360, samples),
+        "WindSpeed": rng.uniform(0, 3, samples)
+    })
+    return frame.reset_index()
+
+
+def load(argv):
+    if "--synthetic" in argv:
+        laps, drivers, total_lap = synthetic_race()
+        weather = synthetic_weather()
+        return (lambda columnar: laptime_process(laps, drivers, total_lap, True, columnar),
+                lambda columnar: weather.to_dict("list" if columnar else "dict"))
+    from util.races import get_session
+    args = [arg for arg in argv[1:] if not arg.startswith("--")]
+    year, gp = (int(args[0]), args[1]) if len(args) >= 2 else (2024, "Hungary")
+    laps, drivers, total_lap = real_race(year, gp)
+    session = get_session(year, gp, "r")
+    return (lambda columnar: laptime_process(laps, drivers, total_lap, True, columnar),
+            lambda columnar: weather_process(session, columnar))
+
+
+def report(name, build):
+    keyed, columnar = build(False), build(True)
+    rows = [
+        ("double-encoded JSON", lambda: json.dumps(json.dumps(keyed)).encode()),
+        ("JSON", lambda: encode_json(keyed)),
+        ("columnar JSON", lambda: encode_json(columnar)),
+        ("columnar msgpack", lambda: encode_columns(columnar))
+    ]
+    print(f"{name}")
+    print(f"  {'format':20} {'encode ms':>10} {'bytes':>12}")
+    for label, encode in rows:
+        body, seconds = timed(encode)
+        print(f"  {label:20} {seconds * 1000:>10.2f} {len(body):>12,}")
+
+
+def main():
+    laptimes, weather = load(sys.argv)
+    report("/session/laptimes", laptimes)
+    report("/session/weatherdata", weather)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
-from util.Fetchpastrace import get_session_data
+from util.Fetchpastrace import BINARY_KINDS, session_cache
+from util.encoding import JSON_TYPE, MSGPACK_TYPE, msgpack
+from util.loader import session_loader
+from util.prefetch import SeasonPrefetcher
+from util.races import enable_fastf1_cache
+from util.keyframes import get_index, parse_at
+from util.replay import ReplaySource
+from util.predictions import LapTimeModel, LapTimePredictor, latest_run
 from util.Livetiming import (
-    file_watcher, background_file_reader, get_race_data,
-    get_driver_data, get_session_info, get_track_status,
-    get_race_control_messages
+    DEFAULT_SESSION, UnknownSessionError, hub, register_session, get_live_session,
+    list_sessions, file_watcher, get_race_data, get_driver_data, get_session_info,
+    get_track_status, get_race_control_messages, get_memory_report
 )
-from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
+import json
 import os
+from typing import Literal
 
 
 app = FastAPI()
@@ -24,63 +33,302 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-FILE_PATH = "fake_saved_data.txt" # change it to saved_data.txt to read actual data
+# Feeds served by this process: session id -> (feed file, replay speed).
+# A speed replays a recording in-process (0 replays as fast as possible); None tails a file written live.
+LIVE_FEEDS = {
+    DEFAULT_SESSION: ("saved_data.tar.gz", 1.0),
+    # "f2": ("fake_saved_data.txt", None),
+}
+
+# Warm the /session cache for completed sessions of the seasons in util.prefetch.PREFETCH_SEASONS
+PREFETCH = True
+
+prefetcher = SeasonPrefetcher(session_loader)
+
+# Predict each car's next lap time with the newest model under artifacts/ (needs keras)
+PREDICTIONS = True
+lap_time_model: LapTimeModel | None = None
+
+SESSION_QUERY = Query(DEFAULT_SESSION, description="Live session id, see /race/sessions")
+
+def load_lap_time_model() -> LapTimeModel | None:
+    run_dir = latest_run()
+    if run_dir is None:
+        print("Lap time predictions disabled: no trained model in artifacts/")
+        return None
+    try:
+        return LapTimeModel(run_dir)
+    except Exception as e:
+        print(f"Lap time predictions disabled: {e}")
+        return None
 
 @app.on_event("startup")
 async def start_background_reader():
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, "w") as f:
-            f.truncate(0)
-    asyncio.create_task(background_file_reader(FILE_PATH))
+    global lap_time_model
+    enable_fastf1_cache()
+    if PREDICTIONS:
+        lap_time_model = await asyncio.to_thread(load_lap_time_model)
+    for session_id, (feed_path, replay_speed) in LIVE_FEEDS.items():
+        session = register_session(session_id, feed_path)
+        if lap_time_model is not None:
+            session.predictor = LapTimePredictor(
+                session.race_data, lap_time_model,
+                lambda payload, channel=session.channel: channel.publish_event("predictions", payload)
+            )
+            asyncio.create_task(session.predictor.run())
+        if replay_speed is not None:
+            session.replay = ReplaySource(feed_path, session.race_data, session.add_message, hub.notify, replay_speed)
+            session.task = asyncio.create_task(session.replay.run())
+        else:
+            # Resume from the latest snapshot when it matches the feed, otherwise start the feed over
+            offset = session.restore_snapshot()
+            if offset is None and os.path.exists(feed_path):
+                with open(feed_path, "w") as f:
+                    f.truncate(0)
+            session.task = asyncio.create_task(session.read_file(offset or 0))
+    asyncio.create_task(hub.run())
+    if PREFETCH:
+        asyncio.create_task(prefetcher.run())
+
+@app.on_event("shutdown")
+async def stop_session_loader():
+    session_loader.shutdown()
+
+@app.exception_handler(UnknownSessionError)
+async def unknown_session(request: Request, exc: UnknownSessionError):
+    return JSONResponse(status_code=404, content={"detail": f"Unknown live session {exc.args[0]!r}"})
 
 @app.get("/stream")
-async def stream(format: str = Query("structured", description="Stream format: 'structured' for race data, 'raw' for original messages")):
-    return StreamingResponse(file_watcher(format), media_type="text/event-stream")
+async def stream(format: str = Query("patch", description="Stream format: 'patch' for a snapshot followed by JSON patches, 'structured' for full race data, 'raw' for original messages"),
+                 session_id: str = SESSION_QUERY):
+    return StreamingResponse(file_watcher(format, session_id), media_type="text/event-stream")
+
+@app.websocket("/ws")
+async def topic_stream(websocket: WebSocket,
+                       topics: str = Query("", description="Comma-separated topics to start with, e.g. 'car:44,track,race_control'"),
+                       session_id: str = SESSION_QUERY):
+    """Push only the race data topics a client subscribed to.
+
+    Clients send {"subscribe": [...]} or {"unsubscribe": [...]} with topics such as 'car:<number>',
+    'drivers', 'track', 'weather', 'race_control', 'timing_stats', 'session', 'top_three', 'driver_list'
+    and 'predictions'.
+
+    The client keeps a JSON document shaped like /race/data that holds only its topics, starting
+    from {}. Every message has a "type":
+    - "snapshot": {"version", "reset", "topics", "ops"}, sent on connect and after each (un)subscribe.
+      With reset true the client empties its document first. "ops" are RFC 6902 operations against the
+      document root that add the new topics (parent containers such as /drivers first) and remove the
+      ones no longer subscribed.
+    - "patch": {"version", "topic", "ops"}, RFC 6902 operations updating one subscribed topic.
+    - "predictions": the payload of /race/predictions, whenever a new lap has been predicted.
+    - "error": {"detail"}, for an unknown topic or a malformed request.
+    A client that falls too far behind gets a reset snapshot, and is closed with 1008 if it keeps lagging.
+    """
+    try:
+        channel = get_live_session(session_id).channel
+    except UnknownSessionError:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    subscriber = channel.subscribe_topics([topic for topic in topics.split(",") if topic])
+
+    async def send():
+        while True:
+            message = await subscriber.queue.get()
+            if message is None:
+                await websocket.close(code=1008)
+                return
+            await websocket.send_text(message)
+
+    sender = asyncio.create_task(send())
+    try:
+        while True:
+            try:
+                request = json.loads(await websocket.receive_text())
+                subscribe, unsubscribe = request.get("subscribe", []), request.get("unsubscribe", [])
+                if not isinstance(subscribe, list) or not isinstance(unsubscribe, list):
+                    raise ValueError
+            except (ValueError, AttributeError):
+                channel.reject(subscriber, 'Expected {"subscribe": [...]} or {"unsubscribe": [...]}')
+                continue
+            channel.update_topics(subscriber, subscribe, unsubscribe)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        sender.cancel()
+        channel.unsubscribe_topics(subscriber)
+
+@app.get("/race/sessions")
+async def race_sessions():
+    """List the live sessions served by this process."""
+    return list_sessions()
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists the current ETag (weak comparison)."""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def conditional_response(request: Request, session_id: str, section: str | None, params: tuple, build) -> Response:
+    """Serve a race data view with an ETag, answering 304 when the client already has its version."""
+    etag, body = get_live_session(session_id).versioned_body(section, params, build)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=JSON_TYPE, headers=headers)
 
 # New structured race data endpoints
 @app.get("/race/data")
-async def race_data():
+async def race_data(request: Request,
+                    at: str = Query(None, description="Rebuild the race data as of a feed timestamp or a lap number"),
+                    session_id: str = SESSION_QUERY):
     """Get complete structured race data including drivers, session, track status."""
-    return get_race_data()
+    if at is None:
+        return conditional_response(request, session_id, None, (), lambda: get_race_data(session_id))
+    try:
+        timestamp, lap = parse_at(at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'at' must be an ISO timestamp or a lap number")
+    index = get_index(get_live_session(session_id).feed_path)
+    return await asyncio.to_thread(index.state_at, timestamp, lap)
 
 @app.get("/race/drivers")
-async def drivers_data(car_number: str = Query(None, description="Specific car number to get data for")):
+async def drivers_data(request: Request,
+                       car_number: str = Query(None, description="Specific car number to get data for"),
+                       session_id: str = SESSION_QUERY):
     """Get driver data for all drivers or a specific car number."""
-    return get_driver_data(car_number)
+    # Every car number that is not in the feed gets the same empty body, so they share one cached view
+    known = not car_number or car_number in get_live_session(session_id).race_data.drivers
+    return conditional_response(request, session_id, "drivers", (car_number if known else "unknown car",),
+                                lambda: get_driver_data(car_number, session_id))
 
 @app.get("/race/session")
-async def session_data():
+async def session_data(request: Request, session_id: str = SESSION_QUERY):
     """Get current session information including lap count and status."""
-    return get_session_info()
+    return conditional_response(request, session_id, "session", (), lambda: get_session_info(session_id))
 
 @app.get("/race/track")
-async def track_data():
+async def track_data(request: Request, session_id: str = SESSION_QUERY):
     """Get track status, weather, and flag information."""
-    return get_track_status()
+    return conditional_response(request, session_id, "track", (), lambda: get_track_status(session_id))
 
 @app.get("/race/messages")
-async def race_messages(limit: int = Query(10, ge=1, le=50, description="Number of recent messages to return")):
+async def race_messages(request: Request,
+                        limit: int = Query(10, ge=1, le=50, description="Number of recent messages to return"),
+                        session_id: str = SESSION_QUERY):
     """Get recent race control messages."""
-    return get_race_control_messages(limit)
+    return conditional_response(request, session_id, "race_control_messages", (limit,),
+                                lambda: get_race_control_messages(limit, session_id))
+
+@app.get("/race/predictions")
+async def race_predictions(session_id: str = SESSION_QUERY):
+    """Get the latest predicted next lap time of every car, refreshed as laps complete."""
+    predictor = get_live_session(session_id).predictor
+    if predictor is None:
+        raise HTTPException(status_code=503, detail="No lap time model loaded")
+    return predictor.latest
+
+@app.get("/race/memory")
+async def memory_report(session_id: str = SESSION_QUERY):
+    """Get memory usage of the live timing history buffers."""
+    return get_memory_report(session_id)
+
+
+def get_replay(session_id: str) -> ReplaySource:
+    replay = get_live_session(session_id).replay
+    if replay is None:
+        raise HTTPException(status_code=404, detail="This session is not a replay")
+    return replay
+
+@app.get("/replay")
+async def replay_status(session_id: str = SESSION_QUERY):
+    """Get the position, speed and state of a session's feed replay."""
+    return get_replay(session_id).status()
+
+@app.post("/replay/pause")
+async def replay_pause(session_id: str = SESSION_QUERY):
+    replay = get_replay(session_id)
+    replay.pause()
+    return replay.status()
+
+@app.post("/replay/resume")
+async def replay_resume(session_id: str = SESSION_QUERY):
+    replay = get_replay(session_id)
+    replay.resume()
+    return replay.status()
+
+@app.post("/replay/speed")
+async def replay_speed(value: float = Query(..., ge=0, description="Multiple of real time, 0 for as fast as possible"),
+                       session_id: str = SESSION_QUERY):
+    replay = get_replay(session_id)
+    replay.set_speed(value)
+    return replay.status()
+
+@app.post("/replay/seek")
+async def replay_seek(at: str = Query(..., description="Feed timestamp or lap number to jump to"),
+                      session_id: str = SESSION_QUERY):
+    replay = get_replay(session_id)
+    try:
+        timestamp, lap = parse_at(at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'at' must be an ISO timestamp or a lap number")
+    await replay.seek(timestamp, lap)
+    return replay.status()
+
+
+# Seconds a client is asked to wait before polling a session that is still loading
+RETRY_AFTER = 2
+
+def wants_binary(request: Request) -> bool:
+    """Content negotiation: serve the binary columnar format only to clients that ask for it."""
+    return msgpack is not None and MSGPACK_TYPE in request.headers.get("accept", "")
+
+async def session_payload(year: int, gp: int|str, session: str, data: str, vary: bool = False):
+    payload = await session_loader.get(year, gp, session, data)
+    headers = {"Vary": "Accept"} if vary else {}
+    if payload is None:
+        headers["Retry-After"] = str(RETRY_AFTER)
+        return JSONResponse(status_code=202, content={"status": "loading"}, headers=headers)
+    # The payload is already encoded, so it is sent as is instead of being serialized again
+    return Response(payload, media_type=MSGPACK_TYPE if data in BINARY_KINDS else JSON_TYPE, headers=headers)
 
 
 @app.get("/session/laptimes")
-async def session_laptimes(year: int=2025, gp: int|str=1, session: str="r"):
-    return get_session_data(year, gp, session, "laptime")
+async def session_laptimes(request: Request, year: int=2025, gp: int|str=1, session: str="r",
+                           shape: Literal["laps", "columnar"] = Query("laps", description="'laps' keys every column by lap number, 'columnar' sends one array per column")):
+    """Lap data per driver; 'Accept: application/msgpack' gets the columnar shape as typed binary arrays."""
+    if wants_binary(request):
+        return await session_payload(year, gp, session, "laptime_msgpack", vary=True)
+    return await session_payload(year, gp, session, "laptime" if shape == "laps" else "laptime_columnar", vary=True)
 
 
 @app.get("/session/weatherdata")
-async def session_weatherdata(year: int=2025, gp: int|str=1, session: str="r"):
-    return get_session_data(year, gp, session, "weather")
+async def session_weatherdata(request: Request, year: int=2025, gp: int|str=1, session: str="r"):
+    """Weather samples; 'Accept: application/msgpack' gets one typed binary array per column."""
+    return await session_payload(year, gp, session, "weather_msgpack" if wants_binary(request) else "weather", vary=True)
 
 
 @app.get("/session/results")
 async def session_results(year: int=2025, gp: int|str=1, session: str="r"):
-    return get_session_data(year, gp, session, "results")
+    return await session_payload(year, gp, session, "results")
 
 
 @app.get("/session/info")
 async def session_info(year: int=2025, gp: int|str=1, session: str="r"):
-    return get_session_data(year, gp, session, "info")
\ No newline at end of file
+    return await session_payload(year, gp, session, "info")
+
+
+@app.get("/session/cache")
+async def session_cache_report():
+    """Get hit counts and memory use of the historical session data cache."""
+    report = session_cache.report()
+    report["loading"] = session_loader.loading
+    return report
+
+
+@app.get("/session/prefetch")
+async def session_prefetch():
+    """Get the progress of the background season prefetcher."""
+    return prefetcher.status()
@@ -1,8 +1,9 @@
 from typing import Literal
 from .races import get_session
+from .resultcache import ResultCache
+from .encoding import encode_columns, encode_json
 import fastf1
 import pandas as pd
-import json
 import datetime
 
 
@@ -21,37 +22,45 @@ weather_var_selections = ["AirTemp", "Humidity", "Pressure", "Rainfall", "TrackT
 weather_time_selection = ["Time"]
 
 
+# Time after a session's start from which its data is treated as final and cached
+FINAL_AFTER = datetime.timedelta(days=1)
+
+# Payload kinds encoded in the binary columnar format instead of JSON
+BINARY_KINDS = {"laptime_msgpack", "weather_msgpack"}
+
+SessionKind = Literal["laptime", "laptime_columnar", "laptime_msgpack", "weather", "weather_msgpack", "results", "info"]
+
+session_cache = ResultCache()
+
+
 def gap_to_leader_process(laps: fastf1.core.Laps, drivers: list[str], total_lap: int): # pyright: ignore
-    lap1 = True
-    out = pd.Series()
-    for idx in range(total_lap):
-        lap = laps.pick_laps(idx)
-        if lap1:
-            lap1 = False
-            laps["GapToLeader"] = pd.Timedelta(0)
-            continue
-        out = out.combine_first(lap.loc[:, "LapStartTime"] - lap.loc[lap["Position"] == 1, "LapStartTime"].to_list()[0])
+    """Gap of every car to the leader at the start of each lap, for laps 1 to total_lap - 1."""
+    laps = laps.loc[(laps["LapNumber"] >= 1) & (laps["LapNumber"] < total_lap), ["LapNumber", "LapStartTime", "Position"]]
+    # The first car in P1 on a lap sets that lap's reference start time
+    leaders = laps.loc[laps["Position"] == 1].drop_duplicates("LapNumber").set_index("LapNumber")["LapStartTime"]
+    out = laps["LapStartTime"] - laps["LapNumber"].map(leaders)
     out.name = "GapToLeader"
     return out
 
-def laptime_process(laps: pd.DataFrame, drivers: list[str], total_lap: int, is_race: bool):
-    out = {}
-    lap_copy = laps.copy()
-    lap_out = laps[laptime_var_selections]
-    time_copy = lap_copy[laptime_time_selections]
-    tem = []
-    for time_selection in laptime_time_selections:
-        tem.append(time_copy[time_selection].dt.total_seconds()) # pyright: ignore
-    time_out = pd.DataFrame(tem).T # pyright: ignore
+def laptime_process(laps: pd.DataFrame, drivers: list[str], total_lap: int, is_race: bool, columnar: bool = False):
+    """Lap data per driver, as {column: {lap number: value}} or, with columnar, as {column: [values]}."""
+    columns = {name: laps[name].dt.total_seconds() for name in laptime_time_selections} # pyright: ignore
+    columns.update((name, laps[name]) for name in laptime_var_selections)
     if is_race:
-        lap_copy = pd.concat([time_out, lap_out, gap_to_leader_process(laps, drivers, total_lap).dt.total_seconds()], axis=1)
-    else:
-        lap_copy = pd.concat([time_out, lap_out], axis=1)
+        columns["GapToLeader"] = gap_to_leader_process(laps, drivers, total_lap).dt.total_seconds().reindex(laps.index)
+    # Convert every column to Python values once, then slice them per driver by row position
+    values = {name: column.tolist() for name, column in columns.items()}
+    lap_numbers = values["LapNumber"]
+    names = [name for name in values if name != "LapNumber"]
+    rows = laps.groupby("DriverNumber", sort=False).indices
+    out = {}
     for driver in drivers:
-        out[driver] = lap_copy.loc[lap_copy["DriverNumber"] == driver]
-        out[driver].astype({"LapNumber": "int32"})
-        out[driver].set_index("LapNumber", inplace=True)
-        out[driver] = out[driver].to_dict()
+        positions = rows.get(driver, ())
+        if columnar:
+            out[driver] = {name: [values[name][i] for i in positions] for name in values}
+        else:
+            driver_laps = [lap_numbers[i] for i in positions]
+            out[driver] = {name: dict(zip(driver_laps, [values[name][i] for i in positions])) for name in names}
     return out
 
 def results_process(results: pd.DataFrame):
@@ -66,7 +75,7 @@ def results_process(results: pd.DataFrame):
     out = out.to_dict()
     return out
 
-def weather_process(data: fastf1.core.Session): # pyright: ignore
+def weather_process(data: fastf1.core.Session, columnar: bool = False): # pyright: ignore
     weather_data = data.laps.pick_drivers(data.results.loc[data.results["Position"] == 1, "Abbreviation"]).get_weather_data()
     weather_out = weather_data[weather_var_selections]
     time_copy = weather_data[weather_time_selection]
@@ -76,7 +85,7 @@ def weather_process(data: fastf1.core.Session): # pyright: ignore
     time_out = pd.DataFrame(tem).T # pyright: ignore
     out = pd.concat([time_out, weather_out], axis=1)
     out.reset_index(inplace=True)
-    out = out.to_dict()
+    out = out.to_dict("list" if columnar else "dict")
     return out
 
 def info_process(info: dict):
@@ -88,20 +97,35 @@ def info_process(info: dict):
             info[idx] = itr.strftime("%Y-%m-%d %H:%M:%S")
     return info
 
-def get_session_data(year: int ,gp: str|int, session_type: str, data: Literal["laptime", "weather", "results", "info"]):
+def session_is_final(session: fastf1.core.Session) -> bool: # pyright: ignore
+    """Whether a session ended long enough ago for its processed data to be cached for good."""
+    try:
+        start = pd.Timestamp(session.date)
+    except (AttributeError, TypeError, ValueError):
+        return False
+    if pd.isna(start):
+        return False
+    if start.tzinfo is not None:
+        start = start.tz_convert(None)
+    return start + FINAL_AFTER < pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+def build_session_data(year: int ,gp: str|int, session_type: str, data: SessionKind) -> tuple[bytes, bool]:
+    """Load and process a session without the cache; returns the encoded payload and whether it is final."""
+    encode = encode_columns if data in BINARY_KINDS else encode_json
     session = get_session(year, gp, session_type)
     try:
         session.laps
     except Exception:
-        return json.dumps(["Error", "Data not found"])
+        return encode(["Error", "Data not found"]), False
     drivers = session.drivers
     total_lap = session.total_laps
     out = ""
     match data:
-        case "laptime":
-            out = laptime_process(session.laps, drivers, total_lap, True if session_type == "r" or session_type == "s" else False)
-        case "weather":
-            out = weather_process(session)
+        case "laptime" | "laptime_columnar" | "laptime_msgpack":
+            out = laptime_process(session.laps, drivers, total_lap, True if session_type == "r" or session_type == "s" else False,
+                                  columnar=data != "laptime")
+        case "weather" | "weather_msgpack":
+            out = weather_process(session, columnar=data == "weather_msgpack")
         case "results":
             out = results_process(session.results)
         case "info":
@@ -109,4 +133,23 @@ def get_session_data(year: int ,gp: str|int, session_type: str, data: Literal["l
             out["TotalLaps"] = total_lap
         case _:
             pass
-    return json.dumps(out)
+    return encode(out), session_is_final(session)
+
+def build_session_payloads(year: int ,gp: str|int, session_type: str, kinds: list[SessionKind]) -> dict[str, tuple[bytes, bool]]:
+    """build_session_data for several payload kinds of one session, loading the session once."""
+    return {kind: build_session_data(year, gp, session_type, kind) for kind in kinds}
+
+def completed_sessions(year: int, session_types: list[str]) -> list[tuple[int, str]]:
+    """(round, session type) of every session in a season that is old enough to be final."""
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    cutoff = pd.Timestamp.now(tz="UTC").tz_localize(None) - FINAL_AFTER
+    out = []
+    for _, event in schedule.iterrows():
+        for session_type in session_types:
+            try:
+                date = event.get_session_date(session_type, utc=True)
+            except ValueError:  # e.g. no sprint at this event
+                continue
+            if not pd.isna(date) and date < cutoff:
+                out.append((int(event["RoundNumber"]), session_type))
+    return out
@@ -1,16 +1,137 @@
-import ast
 import json
 import os
+import time
 import asyncio
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Deque, Dict, List, Any, Optional, Set, Tuple
+from .broadcast import BroadcastHub
+from .history import MessageHistory
+from .tailer import FileTailer
+from .feed import tail_messages
+from .snapshot import SNAPSHOT_INTERVAL, encode_snapshot, load_snapshot, write_snapshot
+
+# Number of state-changing messages whose touched paths are kept for building patches
+# (about 2.5 paths each); clients further behind get a snapshot
+CHANGE_LOG_SIZE = 8000
+# Encoded /race/* bodies kept per live session, one per view (section and query parameters)
+BODY_CACHE_SIZE = 64
+# Race control messages and track flags kept in memory
+RACE_CONTROL_LIMIT = 500
+FLAG_LIMIT = 200
+
+_UNSET = object()
+
+# TimingData fields copied straight onto DriverState attributes
+_TIMING_FIELDS = {
+    "Position": "position",
+    "Line": "line",
+    "BestLapTime": "best_lap_time",
+    "GapToLeader": "gap_to_leader",
+    "IntervalToPositionAhead": "interval_to_ahead",
+    "NumberOfLaps": "number_of_laps",
+    "InPit": "in_pit",
+    "Status": "status"
+}
+
+_SECTOR_INDEX = {"0": 0, "1": 1, "2": 2}
+
+# Top-level keys of RaceData.to_dict(), each versioned on its own
+SECTIONS = ("drivers", "session", "track", "race_control_messages", "timing_stats", "driver_list", "top_three", "last_updated")
+
+
+class DriverState:
+    """Live state of one car, kept in slots instead of a nested dict."""
+
+    __slots__ = (
+        "car_number", "position", "line", "last_lap_time", "best_lap_time",
+        "gap_to_leader", "interval_to_ahead", "number_of_laps", "in_pit", "status",
+        "sector_values", "sector_segments", "speeds", "personal_fastest", "catching",
+        "stints", "current_compound", "new_tires", "tire_laps"
+    )
+
+    # Keys only present in to_dict() once a TimingAppData stint carried a compound
+    _OPTIONAL = ("current_compound", "new_tires", "tire_laps")
+
+    def __init__(self, car_number: str):
+        self.car_number = car_number
+        self.position = None
+        self.line = None
+        self.last_lap_time = None
+        self.best_lap_time = None
+        self.gap_to_leader = None
+        self.interval_to_ahead = None
+        self.number_of_laps = 0
+        self.in_pit = False
+        self.status = None
+        self.sector_values: List[Any] = [None, None, None]
+        self.sector_segments: List[Any] = [{}, {}, {}]
+        self.speeds: Dict[str, Any] = {}
+        self.personal_fastest = False
+        self.catching = None
+        self.stints: Dict[str, Any] = {}
+        self.current_compound = _UNSET
+        self.new_tires = _UNSET
+        self.tire_laps = _UNSET
+
+    def field(self, name: str) -> Any:
+        """Value of one to_dict() key."""
+        if name == "sectors":
+            return {
+                str(idx): {"value": self.sector_values[idx], "segments": self.sector_segments[idx]}
+                for idx in range(3)
+            }
+        value = getattr(self, name)
+        if value is _UNSET:
+            raise KeyError(name)
+        return value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Driver state in the JSON shape served by /race/drivers."""
+        out = {
+            "car_number": self.car_number,
+            "position": self.position,
+            "line": self.line,
+            "last_lap_time": self.last_lap_time,
+            "best_lap_time": self.best_lap_time,
+            "gap_to_leader": self.gap_to_leader,
+            "interval_to_ahead": self.interval_to_ahead,
+            "number_of_laps": self.number_of_laps,
+            "in_pit": self.in_pit,
+            "status": self.status,
+            "sectors": self.field("sectors"),
+            "speeds": self.speeds,
+            "personal_fastest": self.personal_fastest,
+            "catching": self.catching,
+            "stints": self.stints
+        }
+        if self.current_compound is not _UNSET:
+            out["current_compound"] = self.current_compound
+            out["new_tires"] = self.new_tires
+            out["tire_laps"] = self.tire_laps
+        return out
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DriverState":
+        """Rebuild a driver state from its to_dict() form."""
+        driver = cls(data["car_number"])
+        for name in cls.__slots__:
+            if name in data:
+                setattr(driver, name, data[name])
+        for sector_num, sector in data.get("sectors", {}).items():
+            idx = _SECTOR_INDEX.get(sector_num)
+            if idx is not None:
+                driver.sector_values[idx] = sector.get("value")
+                driver.sector_segments[idx] = sector.get("segments", {})
+        return driver
+
 
 class RaceData:
     """Structured F1 race data container that organizes live timing information by category."""
 
-    def __init__(self):
+    def __init__(self, history: Optional[MessageHistory] = None):
         # Driver data indexed by car number
-        self.drivers: Dict[str, Dict[str, Any]] = {}
+        self.drivers: Dict[str, DriverState] = {}
 
         # Session information
         self.session = {
@@ -42,44 +163,37 @@ class RaceData:
         self.driver_list: Dict[str, Any] = {}
         self.top_three: Dict[str, Any] = {}
 
-        # Raw message history for debugging
-        self.raw_history: List[Dict[str, Any]] = []
+        # Raw message history for debugging, shared with the raw stream
+        self.raw_history = history if history is not None else MessageHistory()
 
         # Last update timestamp
         self.last_updated = None
 
-    def get_driver_state(self, car_number: str) -> Dict[str, Any]:
-        """Get or create driver state for a car number."""
-        if car_number not in self.drivers:
-            self.drivers[car_number] = {
-                "car_number": car_number,
-                "position": None,
-                "line": None,
-                "last_lap_time": None,
-                "best_lap_time": None,
-                "gap_to_leader": None,
-                "interval_to_ahead": None,
-                "number_of_laps": 0,
-                "in_pit": False,
-                "status": None,
-                "sectors": {
-                    "0": {"value": None, "segments": {}},
-                    "1": {"value": None, "segments": {}},
-                    "2": {"value": None, "segments": {}}
-                },
-                "speeds": {},
-                "personal_fastest": False,
-                "catching": None,
-                "stints": {}  # Add stints field to store tire compound data
-            }
-        return self.drivers[car_number]
+        # Change tracking: version bumps once per message that touched the state
+        self.version = 0
+        self._changes: Deque[Tuple[int, Tuple[Tuple[str, ...], ...]]] = deque(maxlen=CHANGE_LOG_SIZE)
+        self._change_floor = 0
+        self._pending: Set[Tuple[str, ...]] = set()
+        # Version of the last message that touched each section
+        self.section_versions: Dict[str, int] = dict.fromkeys(SECTIONS, 0)
 
-    def update_from_message(self, message_type: str, data: Dict[str, Any], timestamp: str):
-        """Update race data from a parsed F1 timing message."""
-        self.last_updated = timestamp
+    def _touch(self, *path: str):
+        """Mark a path of the to_dict() structure as changed by the current message."""
+        self._pending.add(path)
 
+    def get_driver_state(self, car_number: str) -> DriverState:
+        """Get or create driver state for a car number."""
+        driver_state = self.drivers.get(car_number)
+        if driver_state is None:
+            self._touch("drivers", car_number)
+            driver_state = self.drivers[car_number] = DriverState(car_number)
+        return driver_state
+
+    def update_from_message(self, message_type: str, data: Dict[str, Any], timestamp: str) -> List[str]:
+        """Update race data from a parsed F1 timing message; returns the cars whose lap count it changed."""
+        lapped: List[str] = []
         if message_type == "TimingData":
-            self._update_timing_data(data)
+            lapped = self._update_timing_data(data)
         elif message_type == "TimingAppData":
             self._update_timing_app_data(data)  # Add handler for TimingAppData
         elif message_type == "WeatherData":
@@ -94,12 +208,95 @@ class RaceData:
             self._update_lap_count(data)
         elif message_type == "DriverList":
             self.driver_list = data
+            self._touch("driver_list")
         elif message_type == "TopThree":
             self.top_three = data
+            self._touch("top_three")
         elif message_type == "TimingStats":
             self.timing_stats = data
+            self._touch("timing_stats")
         elif message_type == "SessionInfo":
             self.session["session_info"] = data
+            self._touch("session", "session_info")
+
+        # Heartbeats and unhandled messages leave the state (and its version) as it was,
+        # so they must not move last_updated either or patch clients would miss it
+        if self._pending:
+            self.last_updated = timestamp
+        self._commit_changes()
+        return lapped
+
+    def _commit_changes(self):
+        """Record the paths touched by the last message under a new version."""
+        pending = self._pending
+        if not pending:
+            return
+        pending.add(("last_updated",))
+        self.version += 1
+        version = self.version
+        changes = self._changes
+        if len(changes) == changes.maxlen:
+            # The oldest message is about to be pushed out of the log
+            self._change_floor = changes[0][0]
+        # One log entry per message rather than per path keeps this off the per-message hot path
+        changes.append((version, tuple(pending)))
+        section_versions = self.section_versions
+        for path in pending:
+            section_versions[path[0]] = version
+        pending.clear()
+
+    def section_version(self, section: Optional[str] = None) -> int:
+        """Version at which a section last changed; the whole container's version without one."""
+        return self.version if section is None else self.section_versions[section]
+
+    def changes_since(self, version: int) -> Optional[Set[Tuple[str, ...]]]:
+        """Paths changed after a version, or None if the change log no longer reaches back that far."""
+        if version < self._change_floor:
+            return None
+        paths = set()
+        for change_version, changed in reversed(self._changes):
+            if change_version <= version:
+                break
+            paths.update(changed)
+        return paths
+
+    def build_patch(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Build JSON Patch (RFC 6902) operations that bring a client at a version up to date."""
+        paths = self.changes_since(version)
+        if paths is None:
+            return None
+        # A changed parent already carries its children
+        ordered = sorted(paths, key=len)
+        kept: Set[Tuple[str, ...]] = set()
+        ops = []
+        for path in ordered:
+            if any(path[:i] in kept for i in range(1, len(path))):
+                continue
+            kept.add(path)
+            ops.append(self.add_op(path))
+        return ops
+
+    def add_op(self, path: Tuple[str, ...]) -> Dict[str, Any]:
+        """JSON Patch operation setting a to_dict() path to its current value."""
+        return {
+            "op": "add",
+            "path": "/" + "/".join(str(key).replace("~", "~0").replace("/", "~1") for key in path),
+            "value": self.value_at(path)
+        }
+
+    def value_at(self, path: Tuple[str, ...]) -> Any:
+        """Look up the current value at a to_dict() path."""
+        if path[0] == "race_control_messages":
+            value: Any = self.race_control_messages[-10:]
+        elif path == ("drivers",):
+            return self.drivers_dict()
+        else:
+            value = getattr(self, path[0])
+        for key in path[1:]:
+            value = value.field(key) if isinstance(value, DriverState) else value[key]
+        if isinstance(value, DriverState):
+            return value.to_dict()
+        return value
 
     def _update_timing_app_data(self, data: Dict[str, Any]):
         """Update timing app data including tire compound information."""
@@ -111,67 +308,61 @@ class RaceData:
 
             # Update tire stints information
             if "Stints" in driver_data:
-                driver_state["stints"] = driver_data["Stints"]
+                driver_state.stints = driver_data["Stints"]
+                self._touch("drivers", car_number, "stints")
 
                 # Extract current tire compound from the latest stint
                 latest_stint = max(driver_data["Stints"].keys(), key=int) if driver_data["Stints"] else None
                 if latest_stint and "Compound" in driver_data["Stints"][latest_stint]:
-                    driver_state["current_compound"] = driver_data["Stints"][latest_stint]["Compound"]
-                    driver_state["new_tires"] = driver_data["Stints"][latest_stint].get("New", "false") == "true"
-                    driver_state["tire_laps"] = driver_data["Stints"][latest_stint].get("TotalLaps", 0)
-
-    def _update_timing_data(self, data: Dict[str, Any]):
-        """Update timing data for drivers."""
+                    driver_state.current_compound = driver_data["Stints"][latest_stint]["Compound"]
+                    driver_state.new_tires = driver_data["Stints"][latest_stint].get("New", "false") == "true"
+                    driver_state.tire_laps = driver_data["Stints"][latest_stint].get("TotalLaps", 0)
+                    self._touch("drivers", car_number, "current_compound")
+                    self._touch("drivers", car_number, "new_tires")
+                    self._touch("drivers", car_number, "tire_laps")
+
+    def _update_timing_data(self, data: Dict[str, Any]) -> List[str]:
+        """Update timing data for drivers; returns the cars whose NumberOfLaps changed."""
+        lapped: List[str] = []
         if "Lines" not in data:
-            return
+            return lapped
 
+        # Hot path: add the changed paths to the pending set directly instead of through _touch
+        touch = self._pending.add
+        drivers = self.drivers
         for car_number, driver_data in data["Lines"].items():
-            driver_state = self.get_driver_state(car_number)
-
-            # Update position and line
-            if "Position" in driver_data:
-                driver_state["position"] = driver_data["Position"]
-            if "Line" in driver_data:
-                driver_state["line"] = driver_data["Line"]
-
-            # Update timing information
-            if "LastLapTime" in driver_data:
-                if isinstance(driver_data["LastLapTime"], dict):
-                    driver_state["last_lap_time"] = driver_data["LastLapTime"]
-                else:
-                    driver_state["last_lap_time"] = {"Value": driver_data["LastLapTime"]}
-
-            if "BestLapTime" in driver_data:
-                driver_state["best_lap_time"] = driver_data["BestLapTime"]
-
-            # Update gaps and intervals
-            if "GapToLeader" in driver_data:
-                driver_state["gap_to_leader"] = driver_data["GapToLeader"]
-            if "IntervalToPositionAhead" in driver_data:
-                driver_state["interval_to_ahead"] = driver_data["IntervalToPositionAhead"]
-
-            # Update lap count
-            if "NumberOfLaps" in driver_data:
-                driver_state["number_of_laps"] = driver_data["NumberOfLaps"]
-
-            # Update pit status
-            if "InPit" in driver_data:
-                driver_state["in_pit"] = driver_data["InPit"]
-            if "Status" in driver_data:
-                driver_state["status"] = driver_data["Status"]
-
-            # Update sector data
-            if "Sectors" in driver_data:
-                for sector_num, sector_data in driver_data["Sectors"].items():
-                    if sector_num in driver_state["sectors"]:
+            driver_state = drivers.get(car_number)
+            if driver_state is None:
+                driver_state = self.get_driver_state(car_number)
+            laps = driver_data.get("NumberOfLaps")
+            if laps is not None and laps != driver_state.number_of_laps:
+                lapped.append(car_number)
+
+            # Walk the handful of keys the message carries instead of probing for every field
+            for key, value in driver_data.items():
+                attr = _TIMING_FIELDS.get(key)
+                if attr is not None:
+                    setattr(driver_state, attr, value)
+                    touch(("drivers", car_number, attr))
+                elif key == "Sectors":
+                    for sector_num, sector_data in value.items():
+                        idx = _SECTOR_INDEX.get(sector_num)
+                        if idx is None:
+                            continue
                         if "Value" in sector_data:
-                            driver_state["sectors"][sector_num]["value"] = sector_data["Value"]
+                            driver_state.sector_values[idx] = sector_data["Value"]
+                            touch(("drivers", car_number, "sectors", sector_num, "value"))
                         if "Segments" in sector_data:
-                            driver_state["sectors"][sector_num]["segments"] = sector_data["Segments"]
-
-            # Update speeds
-            if "Speeds" in driver_data:
-                driver_state["speeds"].update(driver_data["Speeds"])
+                            driver_state.sector_segments[idx] = sector_data["Segments"]
+                            touch(("drivers", car_number, "sectors", sector_num, "segments"))
+                elif key == "Speeds":
+                    driver_state.speeds.update(value)
+                    for speed_type in value:
+                        touch(("drivers", car_number, "speeds", speed_type))
+                elif key == "LastLapTime":
+                    driver_state.last_lap_time = value if isinstance(value, dict) else {"Value": value}
+                    touch(("drivers", car_number, "last_lap_time"))
+        return lapped
 
     def _update_weather_data(self, data: Dict[str, Any]):
         """Update weather information."""
@@ -188,6 +379,7 @@ class RaceData:
         for key, value in data.items():
             if key in weather_mapping:
                 self.track["weather"][weather_mapping[key]] = value
+                self._touch("track", "weather", weather_mapping[key])
 
     def _update_race_control(self, data: Dict[str, Any]):
         """Update race control messages."""
@@ -196,6 +388,9 @@ class RaceData:
                 # Add message ID and store
                 message["message_id"] = msg_id
                 self.race_control_messages.append(message)
+                if len(self.race_control_messages) > RACE_CONTROL_LIMIT:
+                    del self.race_control_messages[:-RACE_CONTROL_LIMIT]
+                self._touch("race_control_messages")
 
                 # Update track flags if it's a flag message
                 if message.get("Category") == "Flag" and "Flag" in message:
@@ -207,11 +402,15 @@ class RaceData:
                         "lap": message.get("Lap", 0)
                     }
                     self.track["flags"].append(flag_info)
+                    if len(self.track["flags"]) > FLAG_LIMIT:
+                        del self.track["flags"][:-FLAG_LIMIT]
+                    self._touch("track", "flags")
 
     def _update_track_status(self, data: Dict[str, Any]):
         """Update track status information."""
         if "Status" in data:
             self.track["status"] = data["Status"]
+            self._touch("track", "status")
         if "Message" in data:
             # Map status codes to meaningful names
             status_map = {
@@ -224,6 +423,7 @@ class RaceData:
             }
             status_code = data["Status"]
             self.track["status_name"] = status_map.get(status_code, f"Status {status_code}")
+            self._touch("track", "status_name")
 
     def _update_session_data(self, data: Dict[str, Any]):
         """Update session status information."""
@@ -233,17 +433,64 @@ class RaceData:
             for status_id, status_data in data["StatusSeries"].items():
                 if "SessionStatus" in status_data:
                     self.session["session_status"] = status_data["SessionStatus"]
+                    self._touch("session", "session_status")
                     latest_status = status_data
 
     def _update_lap_count(self, data: Dict[str, Any]):
         """Update current lap count."""
         if "CurrentLap" in data:
             self.session["current_lap"] = data["CurrentLap"]
+            self._touch("session", "current_lap")
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Sizes of everything the container keeps growing."""
+        return {
+            "history": self.raw_history.memory_report(),
+            "drivers": len(self.drivers),
+            "race_control_messages": len(self.race_control_messages),
+            "flags": len(self.track["flags"]),
+            "change_log": len(self._changes)
+        }
+
+    def state_dict(self) -> Dict[str, Any]:
+        """Everything needed to rebuild this container, for snapshots."""
+        return {
+            "version": self.version,
+            "drivers": self.drivers_dict(),
+            "session": self.session,
+            "track": self.track,
+            "race_control_messages": self.race_control_messages,
+            "timing_stats": self.timing_stats,
+            "driver_list": self.driver_list,
+            "top_three": self.top_three,
+            "last_updated": self.last_updated
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        """Replace the current contents with a state_dict(); the change log starts over."""
+        self.drivers = {car_number: DriverState.from_dict(driver) for car_number, driver in state["drivers"].items()}
+        self.session = state["session"]
+        self.track = state["track"]
+        self.race_control_messages = state["race_control_messages"]
+        self.timing_stats = state["timing_stats"]
+        self.driver_list = state["driver_list"]
+        self.top_three = state["top_three"]
+        self.last_updated = state["last_updated"]
+        # Stay ahead of every version already handed out, so stream clients resync with a snapshot
+        self.version = max(self.version, state["version"]) + 1
+        self._changes.clear()
+        self._change_floor = self.version
+        self._pending.clear()
+        self.section_versions = dict.fromkeys(SECTIONS, self.version)
+
+    def drivers_dict(self) -> Dict[str, Dict[str, Any]]:
+        """All driver states in their JSON shape."""
+        return {car_number: driver.to_dict() for car_number, driver in self.drivers.items()}
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert race data to dictionary for JSON serialization."""
         return {
-            "drivers": self.drivers,
+            "drivers": self.drivers_dict(),
             "session": self.session,
             "track": self.track,
             "race_control_messages": self.race_control_messages[-10:],  # Last 10 messages
@@ -267,82 +514,175 @@ def parse_message(msg):
         return {"raw": str(msg)}
 
 
-# Global race data container and raw history
-race_data = RaceData()
-history = []  # Keep original history for backward compatibility
-
-def add_to_history(msg):
-    """Add message to both structured race data and raw history."""
-    parsed = parse_message(msg)
-    history.append(parsed)
-    race_data.raw_history.append(parsed)
-
-    # Update structured race data
-    if "Title" in parsed and "Data" in parsed:
-        race_data.update_from_message(
-            parsed["Title"],
-            parsed["Data"],
-            parsed.get("Timestamp")
-        )
-
-async def background_file_reader(filepath: str):
-    """Background task that keeps reading file and updating history."""
-    if not os.path.exists(filepath):
-        return
-
-    with open(filepath, "r") as f:
-        # read all old lines once
-        for line in f:
-            try:
-                msg = ast.literal_eval(line.strip())
-                add_to_history(msg)
-            except:
-                continue
+# Session id used when a request does not name one
+DEFAULT_SESSION = "live"
+
+# One broadcast hub ticks the channels of every session
+hub = BroadcastHub()
+
+
+class UnknownSessionError(LookupError):
+    """Raised when a request names a session id that is not registered."""
+
+
+class LiveSession:
+    """One feed served by this process, with its own race data, raw history and broadcast channel."""
+
+    def __init__(self, session_id: str, feed_path: str):
+        self.session_id = session_id
+        self.feed_path = feed_path
+        self.race_data = RaceData()
+        self.history = self.race_data.raw_history
+        self.channel = hub.add_channel(session_id, self.race_data, self.history)
+        self.replay = None  # ReplaySource when the feed is replayed instead of tailed
+        self.predictor = None  # LapTimePredictor when a lap time model is loaded
+        self.task: Optional[asyncio.Task] = None
+        # Versions restart with the process, so ETags also carry when this session was created
+        self.epoch = f"{int(time.time() * 1000):x}"
+        self._bodies: "OrderedDict[Tuple[Any, ...], Tuple[int, bytes]]" = OrderedDict()
+
+    def add_message(self, msg):
+        """Add message to the raw history and the structured race data."""
+        parsed = parse_message(msg)
+        self.history.append(parsed)
+
+        # Update structured race data
+        if "Title" in parsed and "Data" in parsed:
+            lapped = self.race_data.update_from_message(
+                parsed["Title"],
+                parsed["Data"],
+                parsed.get("Timestamp")
+            )
+            # The predictor only has work when a car completes a lap
+            if lapped and self.predictor is not None:
+                self.predictor.observe(lapped)
+
+    def restore_snapshot(self) -> Optional[int]:
+        """Load the latest snapshot of the feed file; returns the byte offset to resume reading from."""
+        if not os.path.exists(self.feed_path):
+            return None
+        snapshot = load_snapshot(self.feed_path)
+        if snapshot is None:
+            return None
+        self.race_data.load_state(snapshot["state"])
+        self.history.restart_at(snapshot["history_seq"])
+        return snapshot["offset"]
+
+    async def read_file(self, offset: int = 0):
+        """Background task that tails the feed file and updates history, waking stream clients per batch.
+
+        The state is snapshotted every SNAPSHOT_INTERVAL seconds so a restart only replays the tail.
+        """
+        if not os.path.exists(self.feed_path):
+            return
 
-        # then keep watching for new lines forever
-        while True:
-            line = f.readline()
-            if not line:
-                await asyncio.sleep(0.1)
-                continue
-            try:
-                msg = ast.literal_eval(line.strip())
-                add_to_history(msg)
-            except:
-                continue
+        race_data = self.race_data
+        last_snapshot = time.monotonic()
+        snapshot_version = race_data.version
+        async for messages, position in tail_messages(FileTailer(self.feed_path, offset)):
+            for msg in messages:
+                try:
+                    self.add_message(msg)
+                except:
+                    continue
+            hub.notify()
+
+            if race_data.version != snapshot_version and time.monotonic() - last_snapshot >= SNAPSHOT_INTERVAL:
+                encoded = encode_snapshot(self.feed_path, position, self.history.end, race_data.state_dict())
+                await asyncio.to_thread(write_snapshot, self.feed_path, encoded)
+                last_snapshot = time.monotonic()
+                snapshot_version = race_data.version
+
+    def versioned_body(self, section: Optional[str], params: Tuple[Any, ...],
+                       build: Callable[[], Any]) -> Tuple[str, bytes]:
+        """ETag and JSON body of a view of the race data, encoded at most once per version of its section.
+
+        section is a key of SECTIONS, or None for views of the whole container.
+        """
+        version = self.race_data.section_version(section)
+        key = (section, params)
+        cached = self._bodies.get(key)
+        if cached is None or cached[0] != version:
+            body = json.dumps(build(), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+            cached = self._bodies[key] = (version, body)
+            # Views are keyed by client parameters; keep only the most recently used ones
+            while len(self._bodies) > BODY_CACHE_SIZE:
+                self._bodies.popitem(last=False)
+        self._bodies.move_to_end(key)
+        return f'"{self.session_id}-{self.epoch}-{section or "all"}-{version}"', cached[1]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "feed": self.feed_path,
+            "replay": self.replay.status() if self.replay is not None else None,
+            "stream_clients": self.channel.subscriber_count,
+            "last_updated": self.race_data.last_updated
+        }
 
-async def file_watcher(stream_type: str = "structured"):
-    """Async generator: send race data - 'structured' for race data, 'raw' for original format."""
-    last_index = 0
-    while True:
-        if stream_type == "structured":
-            # Send structured race data
-            yield f"data: {json.dumps(race_data.to_dict())}\n\n"
-        else:
-            # Send unseen raw history entries (original behavior)
-            while last_index < len(history):
-                yield f"data: {json.dumps(history[last_index])}\n\n"
-                last_index += 1
-        await asyncio.sleep(0.1)
 
-def get_race_data():
+# Every feed served by this process, by session id
+sessions: Dict[str, LiveSession] = {}
+
+def register_session(session_id: str, feed_path: str) -> LiveSession:
+    """Create the live store for a feed; its reader task is started by the caller."""
+    if session_id in sessions:
+        raise ValueError(f"Session {session_id!r} is already registered")
+    session = sessions[session_id] = LiveSession(session_id, feed_path)
+    return session
+
+def get_live_session(session_id: str = DEFAULT_SESSION) -> LiveSession:
+    try:
+        return sessions[session_id]
+    except KeyError:
+        raise UnknownSessionError(session_id) from None
+
+def list_sessions():
+    """Describe every registered session."""
+    return [session.describe() for session in sessions.values()]
+
+def file_watcher(stream_type: str = "patch", session_id: str = DEFAULT_SESSION):
+    """Async generator: 'patch' sends a snapshot then JSON patches, 'structured' full race data, 'raw' original messages."""
+    return get_live_session(session_id).channel.stream(stream_type)
+
+def get_race_data(session_id: str = DEFAULT_SESSION):
     """Get current structured race data."""
-    return race_data.to_dict()
+    return get_live_session(session_id).race_data.to_dict()
 
-def get_driver_data(car_number: str = None):
+def get_driver_data(car_number: str = None, session_id: str = DEFAULT_SESSION):
     """Get driver data for specific car number or all drivers."""
+    race_data = get_live_session(session_id).race_data
     if car_number:
-        return race_data.drivers.get(car_number, {})
-    return race_data.drivers
+        driver = race_data.drivers.get(car_number)
+        return driver.to_dict() if driver is not None else {}
+    return race_data.drivers_dict()
 
-def get_session_info():
+def get_session_info(session_id: str = DEFAULT_SESSION):
     """Get current session information."""
-    return race_data.session
+    return get_live_session(session_id).race_data.session
 
-def get_track_status():
+def get_track_status(session_id: str = DEFAULT_SESSION):
     """Get current track status and conditions."""
-    return race_data.track
-
-def get_race_control_messages(limit: int = 10):
+    return get_live_session(session_id).race_data.track
+
+def _process_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, where /proc is available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def get_memory_report(session_id: str = DEFAULT_SESSION):
+    """Get memory usage of a session's live timing store."""
+    session = get_live_session(session_id)
+    report = session.race_data.memory_report()
+    report["stream_clients"] = session.channel.subscriber_count
+    report["all_stream_clients"] = hub.subscriber_count
+    report["process_rss_bytes"] = _process_rss()
+    return report
+
+def get_race_control_messages(limit: int = 10, session_id: str = DEFAULT_SESSION):
     """Get recent race control messages."""
+    race_data = get_live_session(session_id).race_data
     return race_data.race_control_messages[-limit:] if limit > 0 else race_data.race_control_messages
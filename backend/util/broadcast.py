@@ -0,0 +1,311 @@
+import json
+import time
+import asyncio
+from typing import Iterable, List, Optional, Set, Dict
+from .history import MessageHistory
+from .topics import error_message, event_message, group_patch, is_topic, matches, patch_message, snapshot_message
+
+# Frames buffered per client before it is considered too slow
+QUEUE_SIZE = 256
+# Resyncs a client may need before it is disconnected
+MAX_RESYNCS = 3
+# Longest wait between broadcast ticks when nobody calls notify()
+TICK_INTERVAL = 0.1
+# Seconds between SSE keep-alive comments when nothing has been sent
+HEARTBEAT_INTERVAL = 15.0
+# Raw backlog entries encoded per chunk when a raw client connects
+BACKLOG_CHUNK = 500
+
+STREAM_TYPES = ("patch", "structured", "raw")
+HEARTBEAT_FRAME = b": heartbeat\n\n"
+
+
+def sse_frame(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> bytes:
+    """Encode one server-sent event."""
+    head = ""
+    if event is not None:
+        head += f"event: {event}\n"
+    if event_id is not None:
+        head += f"id: {event_id}\n"
+    return f"{head}data: {data}\n\n".encode()
+
+
+def resync_frame(reason: str, **details) -> bytes:
+    """Tell a client its stream has a gap and it has to rebuild its state."""
+    return sse_frame(json.dumps({"reason": reason, **details}), "resync")
+
+
+class Subscriber:
+    """One connected stream client and its bounded frame queue."""
+
+    def __init__(self, stream_type: str, queue_size: int):
+        self.stream_type = stream_type
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.backlog_end = 0
+        self.resyncs = 0
+        self.closed = False
+
+    def drain(self):
+        """Throw away every frame the client has not read yet."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class TopicSubscriber(Subscriber):
+    """WebSocket client that only receives the race data topics it subscribed to."""
+
+    def __init__(self, queue_size: int):
+        super().__init__("topics", queue_size)
+        self.topics: Set[str] = set()
+
+
+class Channel:
+    """Serializes each race data update of one feed once and fans the encoded frames out to its stream clients."""
+
+    def __init__(self, race_data, history: MessageHistory, queue_size: int = QUEUE_SIZE,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.race_data = race_data
+        self.history = history
+        self.queue_size = queue_size
+        self.heartbeat_interval = heartbeat_interval
+
+        self._subscribers: Dict[str, Set[Subscriber]] = {stream_type: set() for stream_type in STREAM_TYPES}
+        self._topic_subscribers: Set[TopicSubscriber] = set()
+        self._version = race_data.version
+        self._history_index = history.end
+        self._snapshot_cache: Optional[tuple] = None
+        self._last_sent = time.monotonic()
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values()) + len(self._topic_subscribers)
+
+    def _snapshot(self, event: Optional[str]) -> bytes:
+        """Full race data frame, encoded at most once per version."""
+        version = self.race_data.version
+        if self._snapshot_cache is None or self._snapshot_cache[0] != version:
+            self._snapshot_cache = (version, json.dumps(self.race_data.to_dict()))
+        return sse_frame(self._snapshot_cache[1], event, version if event else None)
+
+    def subscribe(self, stream_type: str) -> Subscriber:
+        """Register a client; patch and structured clients start from a full snapshot."""
+        if stream_type not in self._subscribers:
+            stream_type = "raw"
+        subscriber = Subscriber(stream_type, self.queue_size)
+        if stream_type == "patch":
+            subscriber.queue.put_nowait(self._snapshot("snapshot"))
+        elif stream_type == "structured":
+            subscriber.queue.put_nowait(self._snapshot(None))
+        else:
+            subscriber.backlog_end = self._history_index
+        self._subscribers[stream_type].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers[subscriber.stream_type].discard(subscriber)
+
+    def subscribe_topics(self, topics: Iterable[str] = ()) -> TopicSubscriber:
+        """Register a WebSocket client, starting with a snapshot of its initial topics."""
+        subscriber = TopicSubscriber(self.queue_size)
+        self._topic_subscribers.add(subscriber)
+        self.update_topics(subscriber, subscribe=topics)
+        return subscriber
+
+    def unsubscribe_topics(self, subscriber: TopicSubscriber):
+        self._topic_subscribers.discard(subscriber)
+
+    def update_topics(self, subscriber: TopicSubscriber, subscribe: Iterable[str] = (),
+                      unsubscribe: Iterable[str] = ()) -> List[str]:
+        """Change a client's topics and send the operations that add or remove them. Returns the unknown topics."""
+        invalid = [topic for topic in [*subscribe, *unsubscribe] if not isinstance(topic, str) or not is_topic(topic)]
+        before = set(subscriber.topics)
+        subscriber.topics -= {topic for topic in unsubscribe if topic not in invalid}
+        subscriber.topics |= {topic for topic in subscribe if topic not in invalid}
+        messages = [error_message(f"Unknown topic {topic!r}") for topic in invalid]
+        if subscriber.topics != before or not invalid:
+            messages.append(snapshot_message(self.race_data, before, subscriber.topics, False))
+        self._send_topics(subscriber, messages)
+        return invalid
+
+    def reject(self, subscriber: TopicSubscriber, detail: str):
+        """Answer a malformed WebSocket request with an error message."""
+        self._send_topics(subscriber, [error_message(detail)])
+
+    def _send_topics(self, subscriber: TopicSubscriber, messages: List[str]):
+        for message in messages:
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._resync_topics(subscriber)
+                break
+
+    def _resync_topics(self, subscriber: TopicSubscriber):
+        """Reset a slow WebSocket client to a snapshot of all its topics, or drop it if it keeps lagging."""
+        subscriber.resyncs += 1
+        subscriber.drain()
+        if subscriber.resyncs > MAX_RESYNCS:
+            subscriber.queue.put_nowait(error_message("client too slow"))
+            subscriber.queue.put_nowait(None)
+            subscriber.closed = True
+            self.unsubscribe_topics(subscriber)
+            return
+        subscriber.queue.put_nowait(snapshot_message(self.race_data, (), subscriber.topics, True))
+
+    def publish_topics(self, patch: Optional[list]):
+        """Route each topic's share of a patch, encoded once, to the clients subscribed to it."""
+        if patch is None:
+            for subscriber in list(self._topic_subscribers):
+                self._resync_topics(subscriber)
+            return
+        version = self.race_data.version
+        messages = {topic: patch_message(version, topic, ops) for topic, ops in group_patch(patch).items()}
+        for subscriber in list(self._topic_subscribers):
+            self._send_topics(subscriber, [message for topic, message in messages.items()
+                                           if matches(subscriber.topics, topic)])
+
+    def publish_event(self, event: str, payload: Dict):
+        """Send a named event (e.g. predictions) to patch and structured clients and to its WebSocket topic."""
+        frame = sse_frame(json.dumps(payload), event)
+        self.publish("patch", frame)
+        self.publish("structured", frame)
+        message = event_message(event, payload)
+        for subscriber in list(self._topic_subscribers):
+            if event in subscriber.topics:
+                self._send_topics(subscriber, [message])
+
+    def _close(self, subscriber: Subscriber, frame: Optional[bytes] = None):
+        """Disconnect a client after an optional final frame."""
+        subscriber.drain()
+        if frame is not None:
+            subscriber.queue.put_nowait(frame)
+        subscriber.queue.put_nowait(None)
+        subscriber.closed = True
+        self.unsubscribe(subscriber)
+
+    def _resync(self, subscriber: Subscriber):
+        """Replace a slow client's backlog with the current snapshot, or drop it if it keeps lagging."""
+        subscriber.resyncs += 1
+        if subscriber.stream_type == "raw" or subscriber.resyncs > MAX_RESYNCS:
+            self._close(subscriber, resync_frame("client too slow"))
+            return
+        subscriber.drain()
+        if subscriber.stream_type == "patch":
+            subscriber.queue.put_nowait(self._snapshot("snapshot"))
+        else:
+            subscriber.queue.put_nowait(self._snapshot(None))
+
+    def publish(self, stream_type: str, frame: bytes):
+        """Queue the same encoded frame for every client of a stream type."""
+        for subscriber in list(self._subscribers[stream_type]):
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._resync(subscriber)
+
+    def tick(self):
+        """Encode whatever changed since the last tick once and hand it to all clients."""
+        sent = False
+        version = self.race_data.version
+        if version != self._version:
+            patch = None
+            if self._subscribers["patch"] or self._topic_subscribers:
+                patch = self.race_data.build_patch(self._version)
+            if self._subscribers["patch"]:
+                if patch is None:
+                    frame = self._snapshot("snapshot")
+                else:
+                    frame = sse_frame(json.dumps(patch), "patch", version)
+                self.publish("patch", frame)
+            if self._topic_subscribers:
+                self.publish_topics(patch)
+            if self._subscribers["structured"]:
+                self.publish("structured", self._snapshot(None))
+            self._version = version
+            sent = True
+
+        end = self.history.end
+        if end > self._history_index:
+            if self._subscribers["raw"]:
+                first, entries = self.history.since(self._history_index)
+                frame = b"".join(sse_frame(entry) for entry in entries)
+                if first > self._history_index:
+                    frame = resync_frame("history window", next_seq=first) + frame
+                self.publish("raw", frame)
+            self._history_index = end
+            sent = True
+
+        now = time.monotonic()
+        if sent:
+            self._last_sent = now
+        elif now - self._last_sent >= self.heartbeat_interval:
+            for stream_type in STREAM_TYPES:
+                self.publish(stream_type, HEARTBEAT_FRAME)
+            self._last_sent = now
+
+    async def stream(self, stream_type: str = "patch"):
+        """Async generator of encoded SSE frames for one client."""
+        subscriber = self.subscribe(stream_type)
+        try:
+            if subscriber.stream_type == "raw":
+                # Original raw behaviour: replay everything received before the client connected,
+                # with a resync event wherever the bounded history has already dropped messages
+                seq = 0
+                while seq < subscriber.backlog_end:
+                    first = max(seq, self.history.start)
+                    if first >= subscriber.backlog_end:
+                        yield resync_frame("history window", next_seq=subscriber.backlog_end)
+                        break
+                    first, entries = self.history.since(first, min(BACKLOG_CHUNK, subscriber.backlog_end - first))
+                    frame = b"".join(sse_frame(entry) for entry in entries)
+                    if first > seq:
+                        frame = resync_frame("history window", next_seq=first) + frame
+                    yield frame
+                    seq = first + len(entries)
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+
+class BroadcastHub:
+    """Ticks the channels of every feed served by the process from one background task."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, tick_interval: float = TICK_INTERVAL,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.queue_size = queue_size
+        self.tick_interval = tick_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.channels: Dict[str, Channel] = {}
+        self._wakeup = asyncio.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(channel.subscriber_count for channel in self.channels.values())
+
+    def add_channel(self, name: str, race_data, history: MessageHistory) -> Channel:
+        """Register the channel of a feed under its session id."""
+        if name in self.channels:
+            raise ValueError(f"Channel {name!r} already exists")
+        channel = self.channels[name] = Channel(race_data, history, self.queue_size, self.heartbeat_interval)
+        return channel
+
+    def tick(self):
+        for channel in list(self.channels.values()):
+            channel.tick()
+
+    def notify(self):
+        """Wake the hub right away after new data arrived on any channel."""
+        self._wakeup.set()
+
+    async def run(self):
+        """Background task that ticks every channel on notify() and at least once per tick interval."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.tick_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self.tick()
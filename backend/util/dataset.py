@@ -1,147 +1,356 @@
+import os
+import sys
+import numpy as np
 import pandas as pd
-import ast
-
-with open("saved_data.txt", "r", encoding="utf-8") as f:
-    lines = f.readlines()
-
-data = [ast.literal_eval(line.strip()) for line in lines]
-
-
-
-rows = []
-rows_1 = []
-for entry in data:
-    title = entry[0]
-    lines_dict = entry[1].get("Lines", {})
-    time = entry[-1]
-
-    for line_id, line_data in lines_dict.items():
-        row = {
-            "Title": title,
-            "Lines": line_id,
-            "GapToLeader": line_data.get("GapToLeader"),
-            "IntervalToPositionAhead": line_data.get("IntervalToPositionAhead", {}).get("Value"),
-            "Status": None,
-            "Sectors": None,
-            "Segments": None,
-            "ValueSectors": None,
-            "TypeSpeed": None,
-            "SpeedValue": None,
-            "Time": time,
-            "PersonalFastest": line_data.get("PersonalFastest"),
-            "LapTime": line_data.get("LapTime"),
-            "LapNumber": line_data.get("LapNumber"),
-            "NumberOfLaps": line_data.get("NumberOfLaps"),
-            "PersonalBestLapTime": None,
-            "Lab_Personal_Best": None,
-            "Position" :line_data.get("Position"),
-            "PositionAtPersonalBest": None,
-            "BestLapTime": None,
-            "Lap_Best": None,
-            "BestSectors": line_data.get("BestSectors"),
-            "PreviousValue": None,
-            "DiffToAhead": line_data.get("DiffToAhead"),
-            "DiffToLeader": line_data.get("DiffToLeader"),
-            "FullName": line_data.get("FullName"),
-            "FirstName": line_data.get("FirstName"),
-            "LastName": line_data.get("LastName"),
-            "Team": line_data.get("Team"),
-            "TeamColour": line_data.get("TeamColour")
-        }
-        if "Sectors" in line_data:
-            for sec, sec_data in line_data["Sectors"].items():
-                if isinstance(sec_data, dict) and "Segments" in sec_data:
-                    for seg, seg_data in sec_data.get("Segments", {}).items():
-                        out = row.copy()
-                        out["Sectors"] = str(sec)
-                        out["Segments"] = str(seg)
-                        out["Status"] = seg_data.get("Status")
-                        out["ValueSectors"] = sec_data.get("Value")
-                        out["PreviousValue"] = sec_data.get("PreviousValue")
-                        rows.append(out)
-                else:
-                    out = row.copy()
-                    out["Sectors"] = str(sec)
-                    out["Segments"] = None
-                    out["Status"] = None
-                    out["ValueSectors"] = sec_data.get("Value") if isinstance(sec_data, dict) else None
-                    out["PreviousValue"] = sec_data.get("PreviousValue") if isinstance(sec_data, dict) else None
-                    rows.append(out)
-
-        if "Speeds" in line_data:
-            for speed_type, speed_data in line_data["Speeds"].items():
-                row = row.copy()
-                row["TypeSpeed"] = speed_type
-                row["SpeedValue"] = speed_data.get("Value")
-                rows.append(row)
-
-        if "LabTime" in line_data:
-            if "LapTime" in line_data:
-                row["LapTime"] = line_data["LapTime"]
-
-        if "Stints" in line_data:
-            for stint_id, stint_data in line_data["Stints"].items():
-                if "LapTime" in stint_data:
-                    row["LapTime"] = stint_data["LapTime"]
-                if "LapNumber" in stint_data:
-                    row["LapNumber"] = stint_data["LapNumber"]
-
-        if "BestLapTime" in line_data:
-            row["LapTime"] = line_data["BestLapTime"].get("Value")
-            row["LapNumber"] = line_data["BestLapTime"].get("Lap")
-
-        if "PersonalBestLapTime" in line_data:
-            for lap, lab_data in line_data["PersonalBestLapTime"].items():
-                row["PersonalBestLapTime"] = line_data["PersonalBestLapTime"].get("Value")
-                row["Lab_Personal_Best"] = line_data["PersonalBestLapTime"].get("Lap")
-                row["PositionAtPersonalBest"] = line_data["PersonalBestLapTime"].get("Position")
-
-        if "BestLapTime" in line_data:
-            for time, time_data in line_data["BestLapTime"].items():
-                row["BestLapTime"] = line_data["BestLapTime"].get("Value")
-                row["Lap_Best"] = line_data["BestLapTime"].get("Lap")
-
-        rows.append(row)
-
-
-        
-
-df = pd.DataFrame(rows)
-
-for entry in data:
-    if entry[0] == "WeatherData":
-        title = entry[0]
-        line_data = entry[1]
-        time = entry[-1]
-        row = {
-            "Title": "WeatherData",
-            "AirTemp": line_data.get("AirTemp"),
-            "Humidity": line_data.get("Humidity"),
-            "Pressure": line_data.get("Pressure"),
-            "Rainfall": line_data.get("Rainfall"),
-            "TrackTemp": line_data.get("TrackTemp"),
-            "WindDirection": line_data.get("WindDirection"),
-            "WindSpeed": line_data.get("WindSpeed"),
-            "TrackTemp": line_data.get("TrackTemp")
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .feed import iter_messages
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet dataset needs pyarrow
+    pa = pq = None
+
+# Messages flattened between two flushes; each flush writes one row group per table
+CHUNK_MESSAGES = 5000
+DATASET_DIR = "cache/dataset"
+
+# Column types per table. "time" columns are feed timestamps, "number" and "duration"
+# columns are feed strings ('26.6', '1:23.889') converted to floats (seconds) per chunk,
+# "category" columns are dictionary encoded.
+TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "timing_lines": [
+        ("time", "time"), ("car", "int16"), ("position", "int16"), ("gap_to_leader", "string"),
+        ("interval_to_ahead", "string"), ("number_of_laps", "int16"), ("last_lap_time", "duration"),
+        ("best_lap_time", "duration"), ("best_lap", "int16"), ("in_pit", "bool"), ("pit_out", "bool"),
+        ("number_of_pit_stops", "int16"), ("retired", "bool"), ("stopped", "bool"),
+    ],
+    "timing_sectors": [
+        ("time", "time"), ("car", "int16"), ("sector", "int8"), ("value", "duration"),
+        ("previous_value", "duration"), ("personal_fastest", "bool"), ("overall_fastest", "bool"),
+    ],
+    "timing_segments": [
+        ("time", "time"), ("car", "int16"), ("sector", "int8"), ("segment", "int8"), ("status", "int32"),
+    ],
+    "timing_speeds": [
+        ("time", "time"), ("car", "int16"), ("trap", "category"), ("value", "number"),
+        ("personal_fastest", "bool"), ("overall_fastest", "bool"),
+    ],
+    "timing_app_data": [
+        ("time", "time"), ("car", "int16"), ("line", "int16"), ("stint", "int8"), ("compound", "category"),
+        ("new", "bool"), ("total_laps", "int16"), ("start_laps", "int16"), ("lap_time", "duration"),
+    ],
+    "weather_data": [
+        ("time", "time"), ("air_temp", "number"), ("humidity", "number"), ("pressure", "number"),
+        ("rainfall", "number"), ("track_temp", "number"), ("wind_direction", "number"), ("wind_speed", "number"),
+    ],
+}
+
+# Line fields of TimingData: column -> (feed key, sub key of a {'Value': ...} object or None)
+_LINE_FIELDS = {
+    "position": ("Position", None),
+    "gap_to_leader": ("GapToLeader", None),
+    "interval_to_ahead": ("IntervalToPositionAhead", "Value"),
+    "number_of_laps": ("NumberOfLaps", None),
+    "last_lap_time": ("LastLapTime", "Value"),
+    "best_lap_time": ("BestLapTime", "Value"),
+    "best_lap": ("BestLapTime", "Lap"),
+    "in_pit": ("InPit", None),
+    "pit_out": ("PitOut", None),
+    "number_of_pit_stops": ("NumberOfPitStops", None),
+    "retired": ("Retired", None),
+    "stopped": ("Stopped", None),
+}
+_WEATHER_FIELDS = {
+    "air_temp": "AirTemp", "humidity": "Humidity", "pressure": "Pressure", "rainfall": "Rainfall",
+    "track_temp": "TrackTemp", "wind_direction": "WindDirection", "wind_speed": "WindSpeed",
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is required to build the dataset: pip install pyarrow")
+
+
+def _items(value: Any) -> Iterable[Tuple[str, Any]]:
+    """Keyed entries of a feed collection, which arrives as a list in keyframes and as a dict in updates."""
+    if isinstance(value, dict):
+        return value.items()
+    if isinstance(value, list):
+        return ((str(i), item) for i, item in enumerate(value))
+    return ()
+
+
+class TableBuffer:
+    """Column lists of one table for the current chunk."""
+
+    def __init__(self, columns: List[Tuple[str, str]]):
+        self.columns = columns
+        self.names = [name for name, _ in columns]
+        self.clear()
+
+    def clear(self):
+        self.data: Dict[str, List[Any]] = {name: [] for name in self.names}
+        self.rows = 0
+
+    def append(self, values: Dict[str, Any]):
+        for name in self.names:
+            self.data[name].append(values.get(name))
+        self.rows += 1
+
+    def to_arrow(self) -> "pa.Table":
+        """Convert the chunk into a typed table, one vectorized conversion per column."""
+        arrays = {}
+        for name, kind in self.columns:
+            values = self.data[name]
+            if kind == "time":
+                arrays[name] = pa.array(values, pa.string()).cast(pa.timestamp("ms", tz="UTC"))
+            elif kind == "number":
+                arrays[name] = pa.array(pd.to_numeric(pd.Series(values, dtype=object), errors="coerce"), pa.float64())
+            elif kind == "duration":
+                arrays[name] = pa.array(parse_durations(pd.Series(values, dtype=object)), pa.float64())
+            elif kind in ("string", "category"):
+                array = pa.array([None if v is None else str(v) for v in values], pa.string())
+                arrays[name] = array.dictionary_encode() if kind == "category" else array
+            elif kind == "bool":
+                arrays[name] = pa.array([None if v is None else v in (True, "true", "True") for v in values], pa.bool_())
+            else:
+                numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+                arrays[name] = pa.array(numbers, pa.float64()).cast(getattr(pa, kind)())
+        return pa.table(arrays)
+
+
+def parse_durations(values: pd.Series) -> pd.Series:
+    """Feed times such as '1:23.889', '27.657' or '1:02:03.4' as seconds; anything else becomes NaN."""
+    text = values.where(values.map(lambda v: isinstance(v, str)))
+    parts = text.str.split(":", expand=True)
+    if parts.empty:
+        return pd.Series(float("nan"), index=values.index)
+    seconds = pd.Series(0.0, index=values.index)
+    for column in parts.columns:
+        seconds = seconds * 60 + pd.to_numeric(parts[column], errors="coerce").fillna(0)
+    valid = pd.to_numeric(parts[parts.columns[-1]], errors="coerce").notna()
+    return seconds.where(valid)
+
+
+class DatasetBuilder:
+    """Flattens TimingData, TimingAppData and WeatherData messages into typed tables and
+    streams them to Parquet, one row group per table per chunk of messages.
+
+    Output is partitioned like <out_dir>/type=<table>/session=<session>/part-0.parquet, so
+    pandas.read_parquet / pyarrow.dataset can read a table across any number of sessions at once.
+    """
+
+    def __init__(self, out_dir: str, session: str, chunk_messages: int = CHUNK_MESSAGES):
+        _require_pyarrow()
+        self.out_dir = out_dir
+        self.session = session
+        self.chunk_messages = chunk_messages
+        self.buffers = {table: TableBuffer(columns) for table, columns in TABLES.items()}
+        self.rows = {table: 0 for table in TABLES}
+        self._writers: Dict[str, "pq.ParquetWriter"] = {}
+        self._pending = 0
+
+    def table_path(self, table: str) -> str:
+        return os.path.join(self.out_dir, f"type={table}", f"session={self.session}", "part-0.parquet")
+
+    def add(self, message: Any):
+        try:
+            title, data, timestamp = message[0], message[1], message[-1]
+        except (TypeError, IndexError, KeyError):
+            return
+        if not isinstance(data, dict):
+            return
+        if title == "TimingData":
+            self._timing_data(data, timestamp)
+        elif title == "TimingAppData":
+            self._timing_app_data(data, timestamp)
+        elif title == "WeatherData":
+            self._weather_data(data, timestamp)
+        else:
+            return
+        self._pending += 1
+        if self._pending >= self.chunk_messages:
+            self.flush()
+
+    def _timing_data(self, data: Dict[str, Any], timestamp: str):
+        lines, sectors, segments, speeds = (self.buffers[table] for table in
+                                            ("timing_lines", "timing_sectors", "timing_segments", "timing_speeds"))
+        for car, line in _items(data.get("Lines")):
+            if not isinstance(line, dict):
+                continue
+            row = {}
+            for column, (key, sub_key) in _LINE_FIELDS.items():
+                if key in line:
+                    value = line[key]
+                    if sub_key is not None:
+                        if not isinstance(value, dict) or sub_key not in value:
+                            continue
+                        value = value[sub_key]
+                    row[column] = value
+            if row:
+                row["time"], row["car"] = timestamp, car
+                lines.append(row)
+
+            for sector, sector_data in _items(line.get("Sectors")):
+                if not isinstance(sector_data, dict):
+                    continue
+                for segment, segment_data in _items(sector_data.get("Segments")):
+                    if isinstance(segment_data, dict) and "Status" in segment_data:
+                        segments.append({"time": timestamp, "car": car, "sector": sector,
+                                         "segment": segment, "status": segment_data["Status"]})
+                if sector_data.keys() - {"Segments", "Stopped"}:
+                    sectors.append({
+                        "time": timestamp, "car": car, "sector": sector,
+                        "value": sector_data.get("Value"), "previous_value": sector_data.get("PreviousValue"),
+                        "personal_fastest": sector_data.get("PersonalFastest"),
+                        "overall_fastest": sector_data.get("OverallFastest"),
+                    })
+
+            for trap, speed in _items(line.get("Speeds")):
+                if isinstance(speed, dict):
+                    speeds.append({
+                        "time": timestamp, "car": car, "trap": trap, "value": speed.get("Value"),
+                        "personal_fastest": speed.get("PersonalFastest"),
+                        "overall_fastest": speed.get("OverallFastest"),
+                    })
+
+    def _timing_app_data(self, data: Dict[str, Any], timestamp: str):
+        buffer = self.buffers["timing_app_data"]
+        for car, line in _items(data.get("Lines")):
+            if not isinstance(line, dict):
+                continue
+            stints = [(stint, values) for stint, values in _items(line.get("Stints")) if isinstance(values, dict)]
+            if "Line" in line and not stints:
+                buffer.append({"time": timestamp, "car": car, "line": line["Line"]})
+            for stint, values in stints:
+                buffer.append({
+                    "time": timestamp, "car": car, "line": line.get("Line"), "stint": stint,
+                    "compound": values.get("Compound"), "new": values.get("New"),
+                    "total_laps": values.get("TotalLaps"), "start_laps": values.get("StartLaps"),
+                    "lap_time": values.get("LapTime"),
+                })
+
+    def _weather_data(self, data: Dict[str, Any], timestamp: str):
+        row = {column: data.get(key) for column, key in _WEATHER_FIELDS.items()}
+        row["time"] = timestamp
+        self.buffers["weather_data"].append(row)
+
+    def flush(self):
+        """Write the buffered chunk of every table and start a new one."""
+        for table, buffer in self.buffers.items():
+            if not buffer.rows:
+                continue
+            chunk = buffer.to_arrow()
+            writer = self._writers.get(table)
+            if writer is None:
+                path = self.table_path(table)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = self._writers[table] = pq.ParquetWriter(path, chunk.schema)
+            writer.write_table(chunk)
+            self.rows[table] += buffer.rows
+            buffer.clear()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+def session_name(feed_path: str) -> str:
+    """Partition name of a feed: its file name without extensions."""
+    return os.path.basename(feed_path).split(".")[0]
+
+
+def build_dataset(feed_path: str, out_dir: str = DATASET_DIR, session: Optional[str] = None,
+                  chunk_messages: int = CHUNK_MESSAGES) -> Dict[str, int]:
+    """Stream a recorded feed into the partitioned Parquet dataset; returns the rows written per table."""
+    builder = DatasetBuilder(out_dir, session or session_name(feed_path), chunk_messages)
+    try:
+        for message in iter_messages(feed_path):
+            builder.add(message)
+    finally:
+        builder.close()
+    return builder.rows
+
+
+def load_table(table: str, out_dir: str = DATASET_DIR, session: Optional[str] = None) -> pd.DataFrame:
+    """Read one table of the dataset, across all sessions or for a single one."""
+    _require_pyarrow()
+    filters = [("session", "=", session)] if session is not None else None
+    return pd.read_parquet(os.path.join(out_dir, f"type={table}"), filters=filters)
+
+
+class CarIndex:
+    """Per-car view of a dataset table, built with one sort instead of one full scan per car.
+
+    The table is sorted by car and time once and every car's rows are located by offset
+    boundaries, so per-car frames are positional slices of the sorted table (no masking,
+    no copies) and time ranges are binary searches within a car's slice.
+    """
+
+    def __init__(self, df: pd.DataFrame, by: str = "car", time_column: str = "time"):
+        self.df = df.sort_values([by, time_column], kind="stable", ignore_index=True)
+        self.time_column = time_column
+        keys = self.df[by].to_numpy()
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(keys)]
+        self._bounds: Dict[Any, Tuple[int, int]] = {
+            keys[start].item(): (int(start), int(end)) for start, end in zip(starts, ends)
         }
-        rows_1.append(row)
+        times = self.df[time_column]
+        if getattr(times.dt, "tz", None) is not None:
+            times = times.dt.tz_convert(None)
+        self._times = times.to_numpy()
+
+    @property
+    def cars(self) -> List[Any]:
+        return list(self._bounds)
+
+    def __len__(self) -> int:
+        return len(self._bounds)
 
-df_weather = pd.DataFrame(rows_1)
-print(df_weather)
+    def __contains__(self, car: Any) -> bool:
+        return car in self._bounds
 
+    def __iter__(self) -> Iterator[Tuple[Any, pd.DataFrame]]:
+        for car in self._bounds:
+            yield car, self.frame(car)
 
+    def frame(self, car: Any) -> pd.DataFrame:
+        """All rows of a car, in time order."""
+        start, end = self._bounds.get(car, (0, 0))
+        return self.df.iloc[start:end]
 
-#Iaddmorehere
-# dataframe loopers suiters sigma😭🙏
-df['Lines'] = pd.to_numeric(df['Lines'], errors='coerce')
-df = df.sort_values(by=['Title', 'Lines']).reset_index(drop=True)
+    def _time(self, value: Any) -> np.datetime64:
+        ts = pd.Timestamp(value)
+        if ts.tzinfo is not None:
+            ts = ts.tz_convert("UTC").tz_localize(None)
+        return ts.to_datetime64()
 
+    def between(self, car: Any, start: Any = None, end: Any = None) -> pd.DataFrame:
+        """Rows of a car with start <= time < end; either bound may be left open."""
+        first, last = self._bounds.get(car, (0, 0))
+        times = self._times[first:last]
+        lo = first if start is None else first + int(np.searchsorted(times, self._time(start), "left"))
+        hi = last if end is None else first + int(np.searchsorted(times, self._time(end), "left"))
+        return self.df.iloc[lo:max(lo, hi)]
 
 
-line_to_sepdata = {}
-for linenumber in df['Lines'].unique():
-    line_to_sepdata[linenumber] = df[df['Lines'] == linenumber].reset_index(drop=True)
+if __name__ == "__main__":
+    # Run from the backend directory: python -m util.dataset saved_data.txt [out_dir] [session]
+    # (the feed may also be a binary journal or a .tar.gz recording)
+    if len(sys.argv) < 2:
+        print("usage: python -m util.dataset <feed> [out_dir] [session]")
+        sys.exit(1)
+    feed, out = sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else DATASET_DIR
+    name = sys.argv[3] if len(sys.argv) > 3 else session_name(feed)
+    for table, count in build_dataset(feed, out, name).items():
+        print(f"{table}: {count} rows")
 
-for line_number in sorted(line_to_sepdata.keys()):
-    print("\n Dataframe Line:",line_number)
-    print(line_to_sepdata[line_number])
+    index = CarIndex(load_table("timing_lines", out, name))
+    for line_number, frame in index:
+        print("\n Dataframe Line:", line_number)
+        print(frame)
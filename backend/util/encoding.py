@@ -0,0 +1,62 @@
+import sys
+import json
+import math
+from array import array
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:  # the binary format is only offered when msgpack is installed
+    msgpack = None
+
+JSON_TYPE = "application/json"
+# Binary columnar format: msgpack maps whose numeric columns are raw little-endian float64 arrays
+MSGPACK_TYPE = "application/msgpack"
+
+
+def _strict(value: Any) -> Any:
+    """Replace the NaN and infinities pandas uses for missing values with None, recursively."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _strict(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_strict(item) for item in value]
+    return value
+
+
+def encode_json(obj: Any) -> bytes:
+    """Standard JSON that browsers can parse directly: missing values are null instead of NaN."""
+    return json.dumps(_strict(obj), allow_nan=False).encode()
+
+
+def _is_number(value: Any) -> bool:
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+def typed_column(values: list) -> Any:
+    """A numeric column as float64 bytes with NaN for missing values, any other column as a plain list."""
+    if values and all(_is_number(value) for value in values):
+        column = array("d", [math.nan if value is None else value for value in values])
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column.tobytes()
+    return _strict(values)
+
+
+def encode_columns(obj: Any) -> bytes:
+    """msgpack of a payload whose leaves are columns; numeric columns become typed arrays.
+
+    Clients read a bin value as a Float64Array and everything else as it is.
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack is required for the binary format: pip install msgpack")
+
+    def convert(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {str(key): convert(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return typed_column(value)
+        return _strict(value)
+
+    return msgpack.packb(convert(obj), use_bin_type=True)
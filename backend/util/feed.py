@@ -0,0 +1,258 @@
+import io
+import os
+import ast
+import re
+import sys
+import json
+import struct
+import tarfile
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, BinaryIO, Iterable, Iterator, List, Tuple
+from .tailer import FileTailer
+
+try:
+    import msgpack
+except ImportError:  # binary journals need msgpack
+    msgpack = None
+
+# First bytes of a binary journal; everything after is length-prefixed msgpack frames
+JOURNAL_MAGIC = b"F1JOURNAL1\n"
+FRAME_HEADER = struct.Struct(">I")
+# Recordings read straight from the first file inside the archive
+ARCHIVE_SUFFIXES = (".tar.gz", ".tgz", ".tar")
+
+_PY_TOKEN = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"|(True|False|None)")
+_JSON_KEYWORDS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _token_to_json(match: re.Match) -> str:
+    if match.group(3) is not None:
+        return _JSON_KEYWORDS[match.group(3)]
+    body = match.group(1) if match.group(1) is not None else match.group(2)
+    if "\\" in body or '"' in body:
+        return json.dumps(ast.literal_eval(match.group(0)))
+    return '"' + body + '"'
+
+
+def decode_line(line: str) -> Any:
+    """Decode one Python-repr feed line, returning the same value as ast.literal_eval."""
+    line = line.strip()
+    try:
+        if '"' not in line and "\\" not in line and "\x00" not in line:
+            # Every string is single-quoted without escapes, so quotes split the line into
+            # code and string parts; only the code parts can hold True/False/None
+            parts = line.split("'")
+            code = "\x00".join(parts[0::2])
+            if "T" in code or "F" in code or "N" in code:
+                parts[0::2] = code.replace("True", "true").replace("False", "false").replace("None", "null").split("\x00")
+            return json.loads('"'.join(parts))
+        return json.loads(_PY_TOKEN.sub(_token_to_json, line))
+    except ValueError:
+        # Tuples, non-string keys, nan/inf and friends
+        return ast.literal_eval(line)
+
+
+def decode_lines(lines: Iterable[str]) -> List[Any]:
+    """Decode a batch of feed lines, skipping blank and malformed ones."""
+    messages = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            messages.append(decode_line(line))
+        except (ValueError, SyntaxError):
+            continue
+    return messages
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("msgpack is required for binary journals: pip install msgpack")
+
+
+def encode_frame(message: Any) -> bytes:
+    """Encode one message as a length-prefixed msgpack frame."""
+    _require_msgpack()
+    payload = msgpack.packb(message, use_bin_type=True)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """Incrementally splits journal bytes into messages, keeping partial frames between calls."""
+
+    def __init__(self, expect_header: bool = True):
+        _require_msgpack()
+        self._buffer = b""
+        self._header_checked = not expect_header
+
+    @property
+    def pending(self) -> int:
+        """Bytes of an incomplete frame held back for the next call."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> List[Any]:
+        buffer = self._buffer + data
+        if not self._header_checked:
+            if len(buffer) < len(JOURNAL_MAGIC):
+                self._buffer = buffer
+                return []
+            if not buffer.startswith(JOURNAL_MAGIC):
+                raise ValueError("not a feed journal")
+            buffer = buffer[len(JOURNAL_MAGIC):]
+            self._header_checked = True
+
+        messages = []
+        view = memoryview(buffer)
+        pos = 0
+        header_size = FRAME_HEADER.size
+        unpack_header = FRAME_HEADER.unpack_from
+        unpackb = msgpack.unpackb
+        while len(buffer) - pos >= header_size:
+            (size,) = unpack_header(buffer, pos)
+            end = pos + header_size + size
+            if end > len(buffer):
+                break
+            messages.append(unpackb(view[pos + header_size:end]))
+            pos = end
+        view.release()
+        self._buffer = buffer[pos:]
+        return messages
+
+
+def is_archive(path: str) -> bool:
+    return path.endswith(ARCHIVE_SUFFIXES)
+
+
+@contextmanager
+def open_feed(path: str) -> Iterator[BinaryIO]:
+    """Open a feed file, or the first file inside a tar archive, for binary reading."""
+    if not is_archive(path):
+        with open(path, "rb") as f:
+            yield f
+        return
+    with tarfile.open(path, "r:*") as archive:
+        member = next((member for member in archive if member.isfile()), None)
+        if member is None:
+            raise ValueError(f"no feed file in {path}")
+        with archive.extractfile(member) as f:
+            yield f
+
+
+def feed_size(path: str) -> int:
+    """Size of the feed in bytes, uncompressed for archives."""
+    if not is_archive(path):
+        return os.path.getsize(path)
+    with open_feed(path) as f:
+        return f.seek(0, io.SEEK_END)
+
+
+def is_journal(path: str) -> bool:
+    """Whether a feed file is a binary journal rather than Python-repr text."""
+    try:
+        with open_feed(path) as f:
+            return f.read(len(JOURNAL_MAGIC)) == JOURNAL_MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def iter_messages(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Read every message of a text feed, binary journal or archived recording."""
+    journal = is_journal(path)
+    with open_feed(path) as f:
+        if journal:
+            decoder = FrameDecoder()
+            while chunk := f.read(chunk_size):
+                yield from decoder.feed(chunk)
+        else:
+            for line in io.TextIOWrapper(f, encoding="utf-8"):
+                yield from decode_lines((line,))
+
+
+def iter_message_offsets(path: str, start: int = 0) -> Iterator[Tuple[Any, int]]:
+    """Read complete messages from a byte offset on, each with the offset just past it."""
+    with open_feed(path) as f:
+        if f.read(len(JOURNAL_MAGIC)) == JOURNAL_MAGIC:
+            _require_msgpack()
+            offset = max(start, len(JOURNAL_MAGIC))
+            f.seek(offset)
+            while True:
+                header = f.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    return
+                (size,) = FRAME_HEADER.unpack(header)
+                payload = f.read(size)
+                if len(payload) < size:
+                    return
+                offset += FRAME_HEADER.size + size
+                yield msgpack.unpackb(payload), offset
+        else:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # The writer has not finished this line yet
+                    return
+                offset += len(line)
+                try:
+                    message = decode_line(line.decode("utf-8"))
+                except (ValueError, SyntaxError):
+                    continue
+                yield message, offset
+
+
+async def tail_messages(tailer: FileTailer) -> AsyncIterator[Tuple[List[Any], int]]:
+    """Yield batches of messages appended to a text feed or binary journal.
+
+    Each batch comes with the byte offset just past its last complete message. The format
+    is sniffed from the first bytes, again after every truncation or rotation.
+    """
+    pending = b""
+    decoder = None
+    is_text = None
+    if tailer.offset > 0:
+        # Resuming mid-file, so the header is not in the bytes we are about to read
+        is_text = not is_journal(tailer.path)
+        decoder = None if is_text else FrameDecoder(expect_header=False)
+    resets = tailer.resets
+    async for data in tailer.chunks():
+        if tailer.resets != resets:
+            pending, decoder, is_text = b"", None, None
+            resets = tailer.resets
+        if is_text is None:
+            pending += data
+            data = b""
+            if pending.startswith(JOURNAL_MAGIC):
+                is_text, decoder = False, FrameDecoder()
+            elif not JOURNAL_MAGIC.startswith(pending[:len(JOURNAL_MAGIC)]):
+                is_text = True
+            else:
+                continue
+            pending, data = b"", pending
+        if not is_text:
+            messages = decoder.feed(data)
+            yield messages, tailer.offset - decoder.pending
+            continue
+        data = pending + data
+        end = data.rfind(b"\n") + 1
+        pending = data[end:]
+        if end:
+            yield decode_lines(data[:end].decode("utf-8", errors="replace").splitlines()), tailer.offset - len(pending)
+
+
+def convert_to_journal(src: str, dst: str) -> int:
+    """Convert a Python-repr text feed into a binary journal; returns the message count."""
+    count = 0
+    with open(dst, "wb") as out:
+        out.write(JOURNAL_MAGIC)
+        for message in iter_messages(src):
+            out.write(encode_frame(message))
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    # python -m util.feed saved_data.txt saved_data.f1j
+    if len(sys.argv) != 3:
+        print("usage: python -m util.feed <text feed> <journal>")
+        sys.exit(1)
+    print(f"Wrote {convert_to_journal(sys.argv[1], sys.argv[2])} messages to {sys.argv[2]}")
@@ -0,0 +1,77 @@
+import json
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Tuple
+
+# Most raw messages kept in memory
+HISTORY_MAX_MESSAGES = 100_000
+# Most encoded bytes kept in memory
+HISTORY_MAX_BYTES = 64 * 1024 * 1024
+
+
+class MessageHistory:
+    """Ring buffer of JSON-encoded feed messages, capped by count and by bytes.
+
+    Messages are addressed by an absolute sequence number so readers can tell when
+    the entries they still need have already been dropped.
+    """
+
+    def __init__(self, max_messages: int = HISTORY_MAX_MESSAGES, max_bytes: int = HISTORY_MAX_BYTES):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._entries: Deque[str] = deque()
+        self.start = 0  # sequence number of the oldest retained message
+        self.bytes = 0
+
+    @property
+    def end(self) -> int:
+        """Sequence number the next message will get."""
+        return self.start + len(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, message: Dict[str, Any]) -> str:
+        """Encode and store a message, dropping the oldest ones past either cap."""
+        encoded = json.dumps(message)
+        self._entries.append(encoded)
+        self.bytes += len(encoded)
+        while self._entries and (len(self._entries) > self.max_messages or self.bytes > self.max_bytes):
+            self.bytes -= len(self._entries.popleft())
+            self.start += 1
+        return encoded
+
+    def restart_at(self, seq: int):
+        """Drop every entry and number the next message seq, e.g. after restoring a snapshot."""
+        self._entries.clear()
+        self.bytes = 0
+        self.start = seq
+
+    def since(self, seq: int, limit: int = 0) -> Tuple[int, List[str]]:
+        """Encoded messages from a sequence number on, and the sequence number of the first one.
+
+        The first sequence number is larger than requested when the older ones were dropped.
+        """
+        first = max(seq, self.start)
+        last = self.end if limit <= 0 else min(self.end, first + limit)
+        if last <= first:
+            return first, []
+        # Walk in from whichever end of the deque is closer
+        skip_left = first - self.start
+        skip_right = self.end - last
+        if skip_left <= skip_right:
+            return first, list(islice(self._entries, skip_left, skip_left + (last - first)))
+        entries = list(islice(reversed(self._entries), skip_right, skip_right + (last - first)))
+        entries.reverse()
+        return first, entries
+
+    def memory_report(self) -> Dict[str, Any]:
+        return {
+            "messages": len(self._entries),
+            "bytes": self.bytes,
+            "first_seq": self.start,
+            "next_seq": self.end,
+            "dropped": self.start,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes
+        }
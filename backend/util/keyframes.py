@@ -0,0 +1,148 @@
+import json
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from .feed import feed_size, iter_message_offsets
+from .Livetiming import RaceData, parse_message
+
+# Messages between two keyframes; a seek replays at most this many
+KEYFRAME_INTERVAL = 500
+
+
+def parse_timestamp(value: str) -> float:
+    """Feed timestamp ('2025-09-07T12:57:31.138Z') as epoch seconds."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class Keyframe:
+    """Race data state after a message, with where that message ends in the feed."""
+
+    __slots__ = ("offset", "timestamp", "lap", "state")
+
+    def __init__(self, offset: int, timestamp: float, lap: int, state: str):
+        self.offset = offset
+        self.timestamp = timestamp
+        self.lap = lap
+        self.state = state  # JSON-encoded RaceData.state_dict()
+
+
+class KeyframeIndex:
+    """Periodic RaceData keyframes over a recorded feed, for rebuilding the state at any timestamp or lap.
+
+    The index is extended with whatever was appended to the feed each time it is queried.
+    """
+
+    def __init__(self, feed_path: str, interval: int = KEYFRAME_INTERVAL):
+        self.feed_path = feed_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.keyframes: List[Keyframe] = []
+        self.end_offset = 0
+        self._race_data = RaceData()
+        self._since_keyframe = 0
+        self._last_timestamp = float("-inf")
+
+    @staticmethod
+    def _message_time(parsed: Dict[str, Any]) -> float:
+        try:
+            return parse_timestamp(parsed["Timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return float("-inf")
+
+    @staticmethod
+    def _apply(race_data: RaceData, parsed: Dict[str, Any]):
+        if "Title" in parsed and "Data" in parsed:
+            try:
+                race_data.update_from_message(parsed["Title"], parsed["Data"], parsed.get("Timestamp"))
+            except Exception:
+                pass
+
+    @staticmethod
+    def _lap(race_data: RaceData) -> int:
+        try:
+            return int(race_data.session["current_lap"])
+        except (TypeError, ValueError):
+            return 0
+
+    def extend(self):
+        """Index messages appended since the last call, starting over if the feed was truncated."""
+        try:
+            size = feed_size(self.feed_path)
+        except FileNotFoundError:
+            return
+        if size < self.end_offset:
+            self._reset()
+        for message, offset in iter_message_offsets(self.feed_path, self.end_offset):
+            parsed = parse_message(message)
+            self._apply(self._race_data, parsed)
+            self._last_timestamp = max(self._last_timestamp, self._message_time(parsed))
+            self.end_offset = offset
+            self._since_keyframe += 1
+            if self._since_keyframe >= self.interval:
+                self.keyframes.append(Keyframe(
+                    offset, self._last_timestamp, self._lap(self._race_data),
+                    json.dumps(self._race_data.state_dict())
+                ))
+                self._since_keyframe = 0
+
+    def locate(self, timestamp: Optional[float] = None, lap: Optional[int] = None) -> Tuple[RaceData, int]:
+        """Rebuild the race data at a timestamp or when the session reached a lap.
+
+        Returns it together with the feed offset to continue reading from.
+        """
+        with self._lock:
+            self.extend()
+            keyframes = self.keyframes
+            if timestamp is not None:
+                idx = bisect_right([keyframe.timestamp for keyframe in keyframes], timestamp) - 1
+            else:
+                # The lap change itself has to be replayed, so start strictly before it
+                idx = bisect_right([keyframe.lap for keyframe in keyframes], lap - 1) - 1
+            end_offset = self.end_offset
+
+        race_data = RaceData()
+        position = 0
+        if idx >= 0:
+            race_data.load_state(json.loads(keyframes[idx].state))
+            position = keyframes[idx].offset
+
+        for message, offset in iter_message_offsets(self.feed_path, position):
+            if offset > end_offset:
+                break
+            parsed = parse_message(message)
+            if timestamp is not None and self._message_time(parsed) > timestamp:
+                break
+            self._apply(race_data, parsed)
+            position = offset
+            if lap is not None and self._lap(race_data) >= lap:
+                break
+        return race_data, position
+
+    def state_at(self, timestamp: Optional[float] = None, lap: Optional[int] = None) -> Dict[str, Any]:
+        """Race data as it was at a timestamp, or when the session reached a lap."""
+        return self.locate(timestamp, lap)[0].to_dict()
+
+
+_indexes: Dict[str, KeyframeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(feed_path: str) -> KeyframeIndex:
+    """Shared keyframe index for a feed file."""
+    with _indexes_lock:
+        index = _indexes.get(feed_path)
+        if index is None:
+            index = _indexes[feed_path] = KeyframeIndex(feed_path)
+        return index
+
+
+def parse_at(at: str) -> Tuple[Optional[float], Optional[int]]:
+    """Split an ?at= value into a timestamp or a lap number; raises ValueError when it is neither."""
+    at = at.strip()
+    if at.isdigit():
+        return None, int(at)
+    return parse_timestamp(at), None
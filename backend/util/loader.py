@@ -0,0 +1,206 @@
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from .Fetchpastrace import build_session_payloads, session_cache
+from .races import SESSION_CACHE_SIZE, enable_fastf1_cache
+from .resultcache import CacheKey, cache_key
+
+# Worker processes loading and processing historical sessions for visitors; each keeps its own loaded sessions
+LOADER_WORKERS = 2
+# Worker processes for background cache warming, kept apart so visitors never wait behind a prefetch
+PREFETCH_WORKERS = 1
+# Seconds a request waits for a load before it is told the data is still loading
+LOAD_TIMEOUT = 10.0
+# Seconds a payload of a session that is not final yet is kept for the client polling for it
+RECENT_TTL = 60.0
+
+SessionKey = Tuple[int, str, str]
+
+
+class SessionLoader:
+    """Runs historical session loading in worker processes, off the event loop.
+
+    Loads are grouped per session: a request joins the job already building its payload,
+    or queues its kind behind the session's running job. Each job goes to the least busy
+    worker; the worker that loaded the session last is preferred when it is not busier,
+    so queued kinds reuse the session it already has loaded without a slow session
+    holding up unrelated ones. A load keeps running when a caller stops waiting for it.
+
+    warm() jobs run on separate prefetch workers. A queued job runs where the request that
+    created it would have run.
+    """
+
+    def __init__(self, workers: int = LOADER_WORKERS, prefetch_workers: int = PREFETCH_WORKERS):
+        self.workers = workers
+        self.prefetch_workers = prefetch_workers
+        # Visitor workers first, then the prefetch ones
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * (workers + prefetch_workers)
+        # Jobs running or waiting on each worker, and the worker that last loaded each session
+        self._busy: List[int] = [0] * (workers + prefetch_workers)
+        self._homes: "OrderedDict[SessionKey, int]" = OrderedDict()
+        self._loading: Dict[CacheKey, asyncio.Future] = {}
+        # Newest job of each session, and the kinds of a job still waiting for the one before it
+        self._jobs: Dict[SessionKey, asyncio.Future] = {}
+        self._queued: Dict[SessionKey, List[str]] = {}
+        # Payloads of sessions that are not final, with the time they expire
+        self._recent: Dict[CacheKey, Tuple[float, bytes]] = {}
+
+    @property
+    def loading(self) -> int:
+        return len(self._loading)
+
+    def _pool(self, index: int) -> ProcessPoolExecutor:
+        if self._executors[index] is None:
+            # Spawned workers do not inherit the event loop and threads of the server process
+            self._executors[index] = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"),
+                                                        initializer=enable_fastf1_cache)
+        return self._executors[index]
+
+    def _worker(self, session: SessionKey, background: bool) -> int:
+        workers = range(self.workers, len(self._executors)) if background else range(self.workers)
+        least = min(workers, key=self._busy.__getitem__)
+        home = self._homes.get(session)
+        if home in workers and self._busy[home] <= self._busy[least]:
+            return home
+        return least
+
+    def _remember(self, key: CacheKey, payload: bytes):
+        now = time.monotonic()
+        for old in [old for old, (expires, _) in self._recent.items() if expires <= now]:
+            del self._recent[old]
+        self._recent[key] = (now + RECENT_TTL, payload)
+
+    def _recent_payload(self, key: CacheKey) -> Optional[bytes]:
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._recent[key]
+            return None
+        return entry[1]
+
+    async def _load(self, session: SessionKey, year: int, gp: str | int, session_type: str,
+                    kinds: List[str], background: bool) -> Dict[str, bytes]:
+        """Build several payload kinds of one session in a single worker job and keep the results."""
+        loop = asyncio.get_running_loop()
+        index = self._worker(session, background)
+        pool = self._pool(index)
+        self._busy[index] += 1
+        try:
+            results = await loop.run_in_executor(pool, build_session_payloads, year, gp, session_type, kinds)
+        except BrokenProcessPool:
+            # The worker died (e.g. killed for memory); start a fresh one for the next load
+            if self._executors[index] is pool:
+                self._executors[index] = None
+            raise
+        finally:
+            self._busy[index] -= 1
+        self._homes[session] = index
+        self._homes.move_to_end(session)
+        # Workers only keep their last SESSION_CACHE_SIZE sessions loaded
+        while len(self._homes) > len(self._executors) * SESSION_CACHE_SIZE:
+            self._homes.popitem(last=False)
+        payloads = {}
+        for kind, (payload, final) in results.items():
+            key = cache_key(year, gp, session_type, kind)
+            if final:
+                await asyncio.to_thread(session_cache.put, key, payload)
+            else:
+                self._remember(key, payload)
+            payloads[kind] = payload
+        return payloads
+
+    async def _run(self, session: SessionKey, previous: Optional[asyncio.Future], year: int, gp: str | int,
+                   session_type: str, kinds: List[str], background: bool) -> Dict[str, bytes]:
+        if previous is not None:
+            try:
+                await asyncio.wait([previous])
+            finally:
+                # Kinds requested from here on need a job of their own
+                self._queued.pop(session, None)
+        return await self._load(session, year, gp, session_type, kinds, background)
+
+    def _schedule(self, year: int, gp: str | int, session_type: str, kinds: List[str],
+                  background: bool = False) -> asyncio.Future:
+        """Job that builds some kinds of a session: the queued one, or a new one after the running one."""
+        session = cache_key(year, gp, session_type, "")[:3]
+        queued = self._queued.get(session)
+        if queued is not None:
+            queued.extend(kind for kind in kinds if kind not in queued)
+            return self._jobs[session]
+        previous = self._jobs.get(session)
+        kinds = list(kinds)
+        if previous is not None:
+            self._queued[session] = kinds
+        job = asyncio.ensure_future(self._run(session, previous, year, gp, session_type, kinds, background))
+
+        def done(job: asyncio.Future):
+            if self._jobs.get(session) is job:
+                del self._jobs[session]
+
+        self._jobs[session] = job
+        job.add_done_callback(done)
+        return job
+
+    @staticmethod
+    async def _payload(job: asyncio.Future, kind: str) -> bytes:
+        return (await job)[kind]
+
+    def _track(self, key: CacheKey, job: asyncio.Future) -> asyncio.Future:
+        def done(future: asyncio.Future):
+            self._loading.pop(key, None)
+            # Nobody may be waiting on a prefetched payload; mark a failure as seen
+            if not future.cancelled():
+                future.exception()
+
+        future = self._loading[key] = asyncio.ensure_future(self._payload(job, key[3]))
+        future.add_done_callback(done)
+        return future
+
+    async def get(self, year: int, gp: str | int, session_type: str, data: str,
+                  timeout: float = LOAD_TIMEOUT) -> Optional[bytes]:
+        """Encoded payload of a session, or None if it is still loading after the timeout."""
+        key = cache_key(year, gp, session_type, data)
+        payload = await asyncio.to_thread(session_cache.get, key)
+        if payload is None:
+            payload = self._recent_payload(key)
+        if payload is not None:
+            return payload
+        future = self._loading.get(key)
+        if future is None:
+            future = self._track(key, self._schedule(year, gp, session_type, [data]))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def warm(self, year: int, gp: str | int, session_type: str, kinds: List[str]) -> int:
+        """Cache every payload kind of a session that is not cached or loading yet; returns how many were built.
+
+        Requests arriving meanwhile wait on the same load instead of starting their own.
+        """
+        missing = []
+        for kind in kinds:
+            key = cache_key(year, gp, session_type, kind)
+            if key not in self._loading and not await asyncio.to_thread(session_cache.contains, key):
+                missing.append(kind)
+        if not missing:
+            return 0
+        job = self._schedule(year, gp, session_type, missing, background=True)
+        for kind in missing:
+            self._track(cache_key(year, gp, session_type, kind), job)
+        await job
+        return len(missing)
+
+    def shutdown(self):
+        for executor in self._executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = [None] * len(self._executors)
+
+
+session_loader = SessionLoader()
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import glob
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+import numpy as np
+from ai.feature_sch import FEATURE_NAME
+
+try:
+    import joblib
+    import keras
+except ImportError:  # lap time predictions need the training stack (keras, scikit-learn)
+    joblib = keras = None
+
+ARTIFACTS_DIR = "artifacts"
+
+# Columns of the feature rows built from the live feed; a model may use them in any order
+LIVE_FEATURES = [
+    "LapTime_seconds", "TyreAge", "TyreCompound_encoded", "TrackTemp", "AirTemp", "Humidity", "Position",
+    "Rainfall_encoded", "LapTime_rolling_3", "LapTime_rolling_5", "StintLength", "Track_encoded",
+    "SpeedI1", "SpeedI2", "SpeedFL",
+]
+# Training label-encodes compounds per race; a dry race sees HARD, MEDIUM, SOFT in that order
+COMPOUND_CODES = {"HARD": 0, "MEDIUM": 1, "SOFT": 2, "INTERMEDIATE": 3, "WET": 4}
+# Laps outside this range are dropped from training sequences (in/out laps, safety car)
+MIN_LAP_SECONDS, MAX_LAP_SECONDS = 60.0, 120.0
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, dict):
+        value = value.get("Value")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def lap_seconds(value: Any) -> float:
+    """Feed lap time ('1:23.889' or {'Value': '1:23.889'}) in seconds, NaN when missing."""
+    if isinstance(value, dict):
+        value = value.get("Value")
+    if not isinstance(value, str) or not value:
+        return float("nan")
+    seconds = 0.0
+    try:
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return float("nan")
+    return seconds
+
+
+def latest_run(artifacts_dir: str = ARTIFACTS_DIR) -> Optional[str]:
+    """Newest training run directory that has both a final model and its scaler."""
+    runs = sorted(glob.glob(os.path.join(artifacts_dir, "lstm_run_*")), reverse=True)
+    for run in runs:
+        if os.path.exists(os.path.join(run, "final_model.keras")) and os.path.exists(os.path.join(run, "scaler.joblib")):
+            return run
+    return None
+
+
+class LapTimeModel:
+    """The trained LSTM and its feature scaler, loaded once and shared by every live session."""
+
+    def __init__(self, run_dir: str):
+        if keras is None:
+            raise RuntimeError("keras and scikit-learn are required for lap time predictions")
+        self.run = os.path.basename(run_dir)
+        self.model = keras.models.load_model(os.path.join(run_dir, "final_model.keras"), compile=False)
+        scaler = joblib.load(os.path.join(run_dir, "scaler.joblib"))
+        self.timesteps = int(self.model.input_shape[1])
+
+        # Runs record their input columns in config.json; older ones used ai/feature_sch as it is now
+        with open(os.path.join(run_dir, "config.json")) as f:
+            config = json.load(f)
+        self.features: List[str] = config.get("features", FEATURE_NAME)
+        if int(self.model.input_shape[2]) != len(self.features):
+            raise RuntimeError(f"{self.run} takes {self.model.input_shape[2]} features per lap, "
+                               f"its config lists {len(self.features)}")
+        unknown = [name for name in self.features if name not in LIVE_FEATURES]
+        if unknown:
+            raise RuntimeError(f"{self.run} needs features the live feed does not provide: {unknown}")
+        # Live rows are reordered into the model's column order with one fancy index
+        self.order = np.array([LIVE_FEATURES.index(name) for name in self.features])
+        column = {name: idx for idx, name in enumerate(self.features)}
+
+        # Standardize with plain arrays instead of going through scaler.transform per call
+        names = getattr(scaler, "feature_names_in_", None)
+        if names is None or any(name not in column for name in names):
+            raise RuntimeError(f"{self.run}: the scaler columns do not match the model features")
+        self.mean = np.zeros(len(self.features), dtype=np.float32)
+        self.scale = np.ones(len(self.features), dtype=np.float32)
+        for name, mean, scale in zip(names, scaler.mean_, scaler.scale_):
+            self.mean[column[name]] = mean
+            self.scale[column[name]] = scale
+        self.lap_column = column["LapTime_seconds"]
+
+        # Missing values get the training medians, before scaling as in training; runs saved
+        # without them fall back to the scaler mean, which still leaves unscaled columns at 0
+        fill_values = config.get("fill_values", {})
+        self.fill = np.array([fill_values.get(name, np.nan) for name in self.features], dtype=np.float32)
+        self.fill = np.where(np.isnan(self.fill), self.mean, self.fill)
+        # Build the forward pass now rather than on the first lap
+        self.predict(np.zeros((1, self.timesteps, len(LIVE_FEATURES)), dtype=np.float32))
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Next lap time in seconds for a (cars, timesteps, LIVE_FEATURES) batch of unscaled laps."""
+        features = features[..., self.order]
+        features = np.where(np.isnan(features), self.fill, features)
+        scaled = (features - self.mean) / self.scale
+        out = np.asarray(self.model(scaled, training=False)).reshape(-1)
+        return out * self.scale[self.lap_column] + self.mean[self.lap_column]
+
+
+class CarLaps:
+    """Feature rows of a car's last completed laps."""
+
+    __slots__ = ("laps", "rows", "lap_times", "stint", "stint_laps")
+
+    def __init__(self, timesteps: int):
+        self.laps = 0
+        self.rows: Deque[np.ndarray] = deque(maxlen=timesteps)
+        self.lap_times: Deque[float] = deque(maxlen=5)
+        self.stint = None
+        self.stint_laps = 0
+
+
+class LapTimePredictor:
+    """Predicts every car's next lap time from live RaceData, one batched model call per lap.
+
+    observe() runs after each feed message that changes a car's lap count and records a feature
+    row for the cars that completed a lap. Once the leader starts a new lap, run() predicts the whole field at once from each
+    car's latest laps, off the event loop, and publishes it.
+    """
+
+    def __init__(self, race_data, model: LapTimeModel, publish: Callable[[Dict[str, Any]], None]):
+        self.race_data = race_data
+        self.model = model
+        self.publish = publish
+        self.cars: Dict[str, CarLaps] = {}
+        # The driver states seen so far; a replay seek or restored snapshot replaces them
+        self._drivers = race_data.drivers
+        # Laps completed by the leader; predictions run once each time it goes up
+        self.lap = 0
+        self.latest: Dict[str, Any] = {"model": model.run, "version": None, "lap": None, "predictions": {}}
+        self._lap_done = asyncio.Event()
+
+    def _weather(self) -> List[float]:
+        weather = self.race_data.track["weather"]
+        rainfall = _number(weather.get("rainfall"))
+        return [_number(weather.get("track_temp")), _number(weather.get("air_temp")),
+                _number(weather.get("humidity")), float(rainfall > 0) if rainfall == rainfall else 0.0]
+
+    def observe(self, car_numbers: List[str]):
+        """Record a feature row for each of the cars whose lap count the last message changed."""
+        drivers = self.race_data.drivers
+        if drivers is not self._drivers:
+            # The whole state was replaced: every car's history starts over
+            self._drivers = drivers
+            self.cars.clear()
+            self.lap = 0
+        leader, went_back = 0, False
+        for car_number in car_numbers:
+            driver = drivers[car_number]
+            try:
+                laps = int(driver.number_of_laps or 0)
+            except (TypeError, ValueError):
+                continue
+            car = self.cars.get(car_number)
+            if car is None or laps < car.laps:
+                # New car, or its count went back: start its history over
+                went_back = went_back or car is not None
+                car = self.cars[car_number] = CarLaps(self.model.timesteps)
+            leader = max(leader, laps)
+            if laps == car.laps:
+                continue
+            car.laps = laps
+            seconds = lap_seconds(driver.last_lap_time)
+            car.lap_times.append(seconds)
+
+            stint = max(driver.stints, key=int) if driver.stints else None
+            if stint != car.stint:
+                car.stint, car.stint_laps = stint, 0
+            car.stint_laps += 1
+            if not MIN_LAP_SECONDS < seconds < MAX_LAP_SECONDS:
+                continue
+
+            times = list(car.lap_times)
+            track_temp, air_temp, humidity, rainfall = self._weather()
+            compound = driver.current_compound if isinstance(driver.current_compound, str) else None
+            row = np.array([
+                seconds, car.stint_laps, COMPOUND_CODES.get(compound, np.nan), track_temp, air_temp, humidity,
+                _number(driver.position), rainfall,
+                np.mean(times[-3:]) if len(times) >= 3 else np.nan,
+                np.mean(times[-5:]) if len(times) >= 5 else np.nan,
+                car.stint_laps, 0.0,
+                _number(driver.speeds.get("I1")), _number(driver.speeds.get("I2")), _number(driver.speeds.get("FL")),
+            ], dtype=np.float32)
+            car.rows.append(row)
+        if went_back:
+            self.lap = max(car.laps for car in self.cars.values())
+        elif leader > self.lap:
+            self.lap = leader
+            self._lap_done.set()
+
+    def _batch(self):
+        """Cars with a full window of laps, and their stacked windows."""
+        timesteps = self.model.timesteps
+        cars = [number for number, car in self.cars.items() if len(car.rows) == timesteps]
+        if not cars:
+            return cars, None
+        return cars, np.stack([np.stack(self.cars[number].rows) for number in cars])
+
+    async def run(self):
+        """Background task: on each new leader lap, predict the field in one micro-batch and publish it."""
+        while True:
+            await self._lap_done.wait()
+            self._lap_done.clear()
+            version = self.race_data.version
+            cars, batch = self._batch()
+            if batch is None:
+                continue
+            start = time.perf_counter()
+            try:
+                predicted = await asyncio.to_thread(self.model.predict, batch)
+            except Exception as e:
+                print(f"Lap time prediction failed: {e}")
+                continue
+            self.latest = {
+                "model": self.model.run,
+                "version": version,
+                "lap": self.lap,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+                "predictions": {
+                    car: {"next_lap_time": round(float(seconds), 3), "laps": self.cars[car].laps}
+                    for car, seconds in zip(cars, predicted)
+                }
+            }
+            self.publish(self.latest)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List
+from .Fetchpastrace import completed_sessions
+from .loader import SessionLoader
+
+# Seasons whose completed sessions are loaded in the background
+PREFETCH_SEASONS = [2025]
+# Session types warmed for every round
+PREFETCH_SESSIONS = ["r", "q"]
+# Payload kinds cached for every session, the binary and columnar formats included: they are built
+# from the same loaded session in the same worker job, so each one only adds its processing time
+PREFETCH_KINDS = ["results", "laptime", "laptime_columnar", "laptime_msgpack", "weather", "weather_msgpack", "info"]
+# Sessions warmed at once; they run on the loader's own prefetch workers (loader.PREFETCH_WORKERS),
+# so visitors' loads never queue behind them, and more than that many would only wait for a worker
+PREFETCH_CONCURRENCY = 1
+# Seconds between passes over the schedules, so newly completed sessions get picked up
+PREFETCH_INTERVAL = 3600.0
+# Failures kept for the progress report
+ERROR_LIMIT = 20
+
+
+class SeasonPrefetcher:
+    """Walks season schedules and warms the session cache for every completed session."""
+
+    def __init__(self, loader: SessionLoader, seasons: List[int] = PREFETCH_SEASONS,
+                 session_types: List[str] = PREFETCH_SESSIONS, kinds: List[str] = PREFETCH_KINDS,
+                 concurrency: int = PREFETCH_CONCURRENCY, interval: float = PREFETCH_INTERVAL):
+        self.loader = loader
+        self.seasons = seasons
+        self.session_types = session_types
+        self.kinds = kinds
+        self.concurrency = concurrency
+        self.interval = interval
+
+        self.state = "idle"
+        self.passes = 0
+        self.total = 0
+        self.done = 0
+        self.built = 0
+        self.failed = 0
+        self.current: List[str] = []
+        self.errors: Deque[Dict[str, str]] = deque(maxlen=ERROR_LIMIT)
+        self.last_pass = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "seasons": self.seasons,
+            "passes": self.passes,
+            "total": self.total,
+            "done": self.done,
+            "built": self.built,
+            "failed": self.failed,
+            "current": self.current,
+            "errors": list(self.errors),
+            "last_pass": self.last_pass
+        }
+
+    async def _warm(self, semaphore: asyncio.Semaphore, year: int, gp: int, session_type: str):
+        name = f"{year}/{gp}/{session_type}"
+        async with semaphore:
+            self.current.append(name)
+            try:
+                self.built += await self.loader.warm(year, gp, session_type, self.kinds)
+            except Exception as e:
+                self.failed += 1
+                self.errors.append({"session": name, "error": repr(e)})
+            finally:
+                self.current.remove(name)
+                self.done += 1
+
+    async def prefetch(self):
+        """One pass over every configured season."""
+        self.state = "scheduling"
+        sessions = []
+        for year in self.seasons:
+            try:
+                rounds = await asyncio.to_thread(completed_sessions, year, self.session_types)
+            except Exception as e:
+                self.errors.append({"session": str(year), "error": repr(e)})
+                continue
+            sessions.extend((year, gp, session_type) for gp, session_type in rounds)
+
+        self.state = "loading"
+        self.total, self.done = len(sessions), 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._warm(semaphore, *session) for session in sessions))
+        self.passes += 1
+        self.last_pass = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.state = "idle"
+
+    async def run(self):
+        """Background task that repeats the prefetch pass every interval."""
+        while True:
+            await self.prefetch()
+            await asyncio.sleep(self.interval)
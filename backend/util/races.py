@@ -1,8 +1,20 @@
-from functools import cache
+import os
+from functools import lru_cache
 import fastf1
 
+# Fully loaded sessions kept in memory; processed payloads are cached separately on disk
+SESSION_CACHE_SIZE = 4
+# FastF1's own cache of downloaded timing data, shared by the server and its loader workers
+FASTF1_CACHE_DIR = os.path.join("cache", "fastf1")
 
-@cache
+
+def enable_fastf1_cache():
+    """Point FastF1 at the shared cache directory; run at server startup and in every loader worker."""
+    os.makedirs(FASTF1_CACHE_DIR, exist_ok=True)
+    fastf1.Cache.enable_cache(FASTF1_CACHE_DIR)
+
+
+@lru_cache(maxsize=SESSION_CACHE_SIZE)
 def get_session(year: int ,gp: str|int, session_type: str):
     if type(gp) is not int and gp.isdigit():  # pyright: ignore
         get_gp = int(gp)
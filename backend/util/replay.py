@@ -0,0 +1,126 @@
+import time
+import asyncio
+from typing import Any, Callable, Dict, Optional
+from .feed import iter_message_offsets
+from .keyframes import get_index, parse_timestamp
+from .Livetiming import RaceData, parse_message
+
+# Messages applied between two yields to the event loop when replaying unpaced
+BATCH_SIZE = 200
+
+
+class ReplaySource:
+    """Streams a recorded feed (text, journal or .tar.gz archive) into the live store in-process.
+
+    Messages are paced by their own timestamps; speed multiplies real time and 0 replays
+    as fast as possible. The replay can be paused, resumed and moved to any timestamp or lap.
+    """
+
+    def __init__(self, feed_path: str, race_data: RaceData, add_message: Callable[[Any], None],
+                 notify: Callable[[], None], speed: float = 1.0):
+        self.feed_path = feed_path
+        self.race_data = race_data
+        self.add_message = add_message
+        self.notify = notify
+        self.speed = speed
+        self.paused = False
+        self.finished = False
+        self.position = 0  # feed offset of the next message
+        self.feed_time: Optional[str] = None  # timestamp of the last applied message
+
+        self._anchor: Optional[tuple] = None  # (monotonic time, feed time) pacing is measured from
+        self._reopen = False
+        self._wake = asyncio.Event()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "feed": self.feed_path,
+            "speed": self.speed,
+            "paused": self.paused,
+            "finished": self.finished,
+            "position": self.position,
+            "feed_time": self.feed_time
+        }
+
+    def pause(self):
+        self.paused = True
+        self._wake.set()
+
+    def resume(self):
+        self.paused = False
+        self._anchor = None
+        self._wake.set()
+
+    def set_speed(self, speed: float):
+        self.speed = speed
+        self._anchor = None
+        self._wake.set()
+
+    async def seek(self, timestamp: Optional[float] = None, lap: Optional[int] = None):
+        """Jump to a feed timestamp or lap, rebuilding the live state from the nearest keyframe."""
+        state, offset = await asyncio.to_thread(get_index(self.feed_path).locate, timestamp, lap)
+        self.race_data.load_state(state.state_dict())
+        self.position = offset
+        self.feed_time = state.last_updated
+        self.finished = False
+        self._anchor = None
+        self._reopen = True
+        self._wake.set()
+        self.notify()
+
+    async def _sleep(self, delay: Optional[float]):
+        """Sleep for a delay (forever if None) or until a control call wakes the replay."""
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _wait_until_due(self, timestamp: Optional[float]):
+        """Hold a message back while paused or until its time has come at the current speed."""
+        while not self._reopen:
+            if self.paused:
+                self.notify()
+                await self._sleep(None)
+                continue
+            if self.speed <= 0 or timestamp is None:
+                return
+            if self._anchor is None:
+                self._anchor = (time.monotonic(), timestamp)
+                return
+            delay = self._anchor[0] + (timestamp - self._anchor[1]) / self.speed - time.monotonic()
+            if delay <= 0:
+                return
+            # Everything already applied goes out before we idle
+            self.notify()
+            await self._sleep(delay)
+
+    async def run(self):
+        """Background task that replays the feed until it ends, then waits for a seek."""
+        while True:
+            self._reopen = False
+            applied = 0
+            for message, offset in iter_message_offsets(self.feed_path, self.position):
+                parsed = parse_message(message)
+                try:
+                    timestamp = parse_timestamp(parsed["Timestamp"])
+                except (KeyError, TypeError, ValueError):
+                    timestamp = None
+                await self._wait_until_due(timestamp)
+                if self._reopen:
+                    break
+                try:
+                    self.add_message(message)
+                except Exception:
+                    pass
+                self.position = offset
+                self.feed_time = parsed.get("Timestamp", self.feed_time)
+                applied += 1
+                if applied % BATCH_SIZE == 0:
+                    self.notify()
+                    await asyncio.sleep(0)
+            else:
+                self.finished = True
+                self.notify()
+                while not self._reopen:
+                    await self._sleep(None)
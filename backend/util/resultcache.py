@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+# Directory holding processed payloads of finished sessions
+CACHE_DIR = os.path.join("cache", "session_data")
+# Encoded bytes kept in the in-memory tier
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+# Bump when the shape of the processed payloads changes so older files are ignored
+CACHE_FORMAT = 2
+
+CacheKey = Tuple[int, str, str, str]
+
+
+def cache_key(year: int, gp: str | int, session_type: str, kind: str) -> CacheKey:
+    """Normalize request parameters into a cache key; '14' and 14 name the same round."""
+    return (int(year), str(gp).strip().lower(), session_type.strip().lower(), kind)
+
+
+class ResultCache:
+    """Encoded payloads in a byte-capped LRU memory tier in front of a directory that survives restarts."""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MEMORY_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: CacheKey) -> str:
+        year, gp, session_type, kind = key
+        # Quoting keeps names like "Italian Grand Prix" or "../x" inside the cache directory
+        name = quote(f"{gp}_{session_type}_{kind}", safe="") + (".msgpack" if kind.endswith("_msgpack") else ".json")
+        return os.path.join(self.directory, f"v{CACHE_FORMAT}", str(year), name)
+
+    def _remember(self, key: CacheKey, payload: bytes):
+        """Put a payload in the memory tier, evicting the least recently used ones past the cap."""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old)
+        if len(payload) > self.max_bytes:
+            return
+        self._entries[key] = payload
+        self.bytes += len(payload)
+        while self.bytes > self.max_bytes:
+            _, dropped = self._entries.popitem(last=False)
+            self.bytes -= len(dropped)
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        """Cached payload from memory, else from disk, or None."""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return payload
+        try:
+            with open(self._path(key), "rb") as f:
+                payload = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self._remember(key, payload)
+            self.disk_hits += 1
+        return payload
+
+    def contains(self, key: CacheKey) -> bool:
+        """Whether a payload is cached, without reading it."""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return os.path.exists(self._path(key))
+
+    def put(self, key: CacheKey, payload: bytes):
+        """Store a payload in both tiers; the file is replaced atomically."""
+        with self._lock:
+            self._remember(key, payload)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._entries),
+                "memory_bytes": self.bytes,
+                "max_memory_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "directory": self.directory
+            }
@@ -0,0 +1,55 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+# Seconds between snapshots while the feed keeps changing the state
+SNAPSHOT_INTERVAL = 5.0
+# Leading bytes of the feed hashed to recognise the same recording after a restart
+HEAD_BYTES = 4096
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_path(feed_path: str) -> str:
+    """Snapshot file kept next to a feed file."""
+    return feed_path + ".snapshot.json"
+
+
+def _head_digest(feed_path: str, offset: int) -> str:
+    with open(feed_path, "rb") as f:
+        return hashlib.sha1(f.read(min(offset, HEAD_BYTES))).hexdigest()
+
+
+def encode_snapshot(feed_path: str, offset: int, history_seq: int, state: Dict[str, Any]) -> str:
+    """Serialize race data state together with the feed position it corresponds to."""
+    return json.dumps({
+        "format": SNAPSHOT_FORMAT,
+        "offset": offset,
+        "head": _head_digest(feed_path, offset),
+        "history_seq": history_seq,
+        "state": state
+    })
+
+
+def write_snapshot(feed_path: str, encoded: str):
+    """Atomically replace the feed's snapshot file."""
+    path = snapshot_path(feed_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(encoded)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(feed_path: str) -> Optional[Dict[str, Any]]:
+    """Latest snapshot for a feed, or None when missing, unreadable or taken from a different recording."""
+    try:
+        with open(snapshot_path(feed_path), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("format") != SNAPSHOT_FORMAT:
+            return None
+        offset = snapshot["offset"]
+        if os.path.getsize(feed_path) < offset or _head_digest(feed_path, offset) != snapshot["head"]:
+            return None
+        return snapshot
+    except (OSError, ValueError, KeyError):
+        return None
@@ -0,0 +1,98 @@
+import os
+import asyncio
+from typing import AsyncIterator, Optional
+
+try:
+    from watchfiles import awatch
+except ImportError:  # fall back to polling the file
+    awatch = None
+
+# Bytes read per os-level read call
+CHUNK_SIZE = 1 << 20
+# Seconds between checks when no change notifications are available
+POLL_INTERVAL = 0.05
+# Seconds between safety checks while waiting for notifications
+NOTIFY_TIMEOUT = 1.0
+
+
+class FileTailer:
+    """Follows a growing file, reading new bytes in bulk and surviving truncation and rotation."""
+
+    def __init__(self, path: str, offset: int = 0, use_notify: bool = True):
+        self.path = os.path.abspath(path)
+        self.offset = offset
+        self.use_notify = use_notify and awatch is not None
+        self.resets = 0
+        self._file = None
+        self._inode: Optional[int] = None
+        self._changed = asyncio.Event()
+
+    def _open(self) -> bool:
+        """Open the file at the current offset; False if it does not exist yet."""
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._file.seek(self.offset)
+        return True
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check_reset(self) -> bool:
+        """Detect truncation or replacement of the file and restart from its beginning."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if stat.st_ino != self._inode or stat.st_size < self.offset:
+            self._close()
+            self.offset = 0
+            self.resets += 1
+            return True
+        return False
+
+    def _read_available(self) -> bytes:
+        """Read everything appended since the last call."""
+        if self._file is None and not self._open():
+            return b""
+        data = self._file.read(CHUNK_SIZE)
+        if not data:
+            # Only look for truncation or rotation once the current file is drained
+            if self._check_reset() and self._open():
+                data = self._file.read(CHUNK_SIZE)
+        self.offset += len(data)
+        return data
+
+    async def _watch(self):
+        """Set the change event whenever the file's directory reports a change to it."""
+        async for changes in awatch(os.path.dirname(self.path), debounce=20, step=5,
+                                    watch_filter=lambda change, changed_path: changed_path == self.path):
+            self._changed.set()
+
+    async def _wait(self):
+        """Sleep until the file changes, or for one poll interval without notifications."""
+        timeout = NOTIFY_TIMEOUT if self.use_notify else POLL_INTERVAL
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Yield blocks of newly appended bytes forever."""
+        watcher = asyncio.create_task(self._watch()) if self.use_notify else None
+        try:
+            while True:
+                data = self._read_available()
+                if data:
+                    yield data
+                    continue
+                await self._wait()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            self._close()
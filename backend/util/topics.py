@@ -0,0 +1,138 @@
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Topics a WebSocket client can subscribe to, and the race data path each one covers.
+# 'car:<number>' covers a single entry of 'drivers'.
+TOPIC_PATHS: Dict[str, Tuple[str, ...]] = {
+    "drivers": ("drivers",),
+    "track": ("track",),
+    "weather": ("track", "weather"),
+    "race_control": ("race_control_messages",),
+    "timing_stats": ("timing_stats",),
+    "session": ("session",),
+    "top_three": ("top_three",),
+    "driver_list": ("driver_list",),
+}
+CAR_PREFIX = "car:"
+# Topics carrying messages other than race data patches
+EVENT_TOPICS = ("predictions",)
+
+
+def is_topic(topic: str) -> bool:
+    return (topic in TOPIC_PATHS or topic in EVENT_TOPICS
+            or (topic.startswith(CAR_PREFIX) and len(topic) > len(CAR_PREFIX)))
+
+
+def topic_path(topic: str) -> Tuple[str, ...]:
+    if topic.startswith(CAR_PREFIX):
+        return ("drivers", topic[len(CAR_PREFIX):])
+    return TOPIC_PATHS[topic]
+
+
+def topic_of(pointer: str) -> Optional[str]:
+    """Topic a JSON Patch path belongs to, or None for paths no topic covers (last_updated)."""
+    keys = [key.replace("~1", "/").replace("~0", "~") for key in pointer.split("/")[1:]]
+    section = keys[0]
+    if section == "drivers":
+        return CAR_PREFIX + keys[1] if len(keys) > 1 else "drivers"
+    if section == "track":
+        return "weather" if len(keys) > 1 and keys[1] == "weather" else "track"
+    if section == "race_control_messages":
+        return "race_control"
+    return section if section in TOPIC_PATHS else None
+
+
+def group_patch(ops: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Split the operations of one race data patch by topic."""
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for op in ops:
+        topic = topic_of(op["path"])
+        if topic is not None:
+            groups[topic].append(op)
+    return groups
+
+
+def matches(topics: Set[str], topic: str) -> bool:
+    """Whether a subscription receives updates of a topic; 'drivers' includes every car and 'track' the weather."""
+    if topic in topics:
+        return True
+    if topic.startswith(CAR_PREFIX):
+        return "drivers" in topics
+    return topic == "weather" and "track" in topics
+
+
+def _roots(topics: Iterable[str]) -> Set[Tuple[str, ...]]:
+    """Race data paths a set of topics puts in the client document, without those inside another one."""
+    paths = {topic_path(topic) for topic in topics if topic not in EVENT_TOPICS}
+    return {path for path in paths if not any(path[:i] in paths for i in range(1, len(path)))}
+
+
+def _covered(path: Tuple[str, ...], roots: Set[Tuple[str, ...]]) -> bool:
+    return any(path[:i] in roots for i in range(1, len(path) + 1))
+
+
+def _pointer(path: Tuple[str, ...]) -> str:
+    return "/" + "/".join(key.replace("~", "~0").replace("/", "~1") for key in path)
+
+
+def snapshot_message(race_data, before: Iterable[str], after: Iterable[str], reset: bool) -> str:
+    """RFC 6902 operations that take a client document holding the topics `before` to one holding `after`.
+
+    With reset the client starts over from an empty document. Topics that are no longer
+    subscribed are removed, and containers like /drivers are added before the entries inside them.
+    """
+    old, new = _roots(() if reset else before), _roots(after)
+    # Containers the client document already has: every ancestor of what it holds
+    containers = {path[:i] for path in old for i in range(1, len(path))}
+    ops: List[Dict[str, Any]] = []
+    for path in sorted(old):
+        if _covered(path, new):
+            continue
+        old.discard(path)
+        containers = {container for container in containers if container[:len(path)] != path}
+        try:
+            race_data.value_at(path)
+        except KeyError:
+            # A car that never showed up in the feed was never added either
+            continue
+        ops.append({"op": "remove", "path": _pointer(path)})
+    # Drop containers left without any topic inside them
+    kept = old | new
+    for container in sorted(containers, key=len, reverse=True):
+        if not any(path[:len(container)] == container for path in kept):
+            containers.discard(container)
+            ops.append({"op": "remove", "path": _pointer(container)})
+    for path in sorted(new, key=lambda path: (len(path), path)):
+        if _covered(path, old):
+            continue
+        try:
+            op = race_data.add_op(path)
+        except KeyError:
+            # A car that is not in the feed (yet) starts out empty
+            op = None
+        for i in range(1, len(path)):
+            if path[:i] not in containers and not _covered(path[:i], old):
+                ops.append({"op": "add", "path": _pointer(path[:i]), "value": {}})
+                containers.add(path[:i])
+        if op is not None:
+            ops.append(op)
+    return json.dumps({
+        "type": "snapshot",
+        "version": race_data.version,
+        "reset": reset,
+        "topics": sorted(after),
+        "ops": ops
+    })
+
+
+def patch_message(version: int, topic: str, ops: List[Dict[str, Any]]) -> str:
+    return json.dumps({"type": "patch", "version": version, "topic": topic, "ops": ops})
+
+
+def event_message(topic: str, payload: Dict[str, Any]) -> str:
+    return json.dumps({"type": topic, **payload})
+
+
+def error_message(detail: str) -> str:
+    return json.dumps({"type": "error", "detail": detail})
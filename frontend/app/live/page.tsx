@@ -12,6 +12,7 @@ import {
   PaginationItem,
   PaginationLink
 } from "@/components/ui/pagination";
+import {applyPatch, PatchOperation} from "@/lib/json-patch";
 
 interface RaceData {
   drivers: Record<string, DriverData> | null;
@@ -164,11 +165,14 @@ export default function Live() {
   const [driverData, setDriverData] = useState<Record<string, { shortname: string, fullname: string, code: string, team: string, color: string }> | null>(null);
   useEffect(() => {
     const eventSource = new EventSource("http://100.125.78.96:1234/stream");
-    eventSource.onmessage = (event) => {
+    eventSource.addEventListener("snapshot", (event) => {
       const parsedData: RaceData = JSON.parse(event.data);
       setData(parsedData);
-      console.log(data)
-    };
+    });
+    eventSource.addEventListener("patch", (event) => {
+      const ops: PatchOperation[] = JSON.parse(event.data);
+      setData((current) => current && applyPatch(current, ops));
+    });
     eventSource.onerror = (error) => {
       console.error("EventSource failed:", error);
       eventSource.close();
@@ -176,7 +180,7 @@ export default function Live() {
     return () => {
       eventSource.close();
     }
-  })
+  }, [])
 
   useEffect(() => {
     fetch(`https://api.openf1.org/v1/drivers?meeting_key=${data?.session?.session_info?.Meeting?.Key}`).then((response) => response.json()).then((content) => {
@@ -1,6 +1,7 @@
 "use client";
 
 import { useState, useEffect, use } from "react";
+import { fetchSessionData } from "@/lib/session-data";
 import {Badge} from "@/components/ui/badge";
 import {Table, TableBody, TableCell, TableHead, TableHeader, TableRow,} from "@/components/ui/table"
 
@@ -33,9 +34,7 @@ export default function QualiStats({ params }: { params: Promise<{ season: strin
       };
       setRace(temp)
     })
-    fetch(`http://100.125.78.96:1234/session/results?year=${season}&gp=${round}&session=q`).then((response) => response.json()).then((content) => {
-      content = JSON.parse(content.replaceAll("NaN", "null"))
-
+    fetchSessionData(`http://100.125.78.96:1234/session/results?year=${season}&gp=${round}&session=q`).then((response) => response.json()).then((content) => {
       let temp: { name: string, dnumber: string, team: string, color: string, position: number, q1: number | null, q2: number | null, q3: number | null}[] = [];
       for (let i in content.DriverNumber) {
         temp.push({
@@ -1,6 +1,7 @@
 "use client";
 
 import {use, useEffect, useState} from "react";
+import {fetchSessionData} from "@/lib/session-data";
 import {Button} from "@/components/ui/button";
 import {Table, TableBody, TableCell, TableHead, TableHeader, TableRow,} from "@/components/ui/table"
 import {Select, SelectContent, SelectItem, SelectTrigger, SelectValue,} from "@/components/ui/select";
@@ -47,9 +48,7 @@ export default function PastStats({ params }: { params: Promise<{ season: string
       };
       setRace(temp)
     })
-    fetch(`http://100.125.78.96:1234/session/results?year=${season}&gp=${round}&session=r`).then((response) => response.json()).then((content) => {
-      content = JSON.parse(content.replaceAll("NaN", "null"))
-
+    fetchSessionData(`http://100.125.78.96:1234/session/results?year=${season}&gp=${round}&session=r`).then((response) => response.json()).then((content) => {
       let temp: { name: string, dnumber: string, code: string, team: string, color: string, position: number, grid: number | null, time: number | null }[] = [];
       for (let i in content.DriverNumber) {
         temp.push({
@@ -69,9 +68,7 @@ export default function PastStats({ params }: { params: Promise<{ season: string
       setData(temp)
       setDriver(parseInt(temp[0].dnumber))
     })
-    fetch(`http://100.125.78.96:1234/session/laptimes?year=${season}&gp=${round}&session=r`).then((response) => response.json()).then((content) => {
-      content = JSON.parse(content.replaceAll("NaN", "null"))
-
+    fetchSessionData(`http://100.125.78.96:1234/session/laptimes?year=${season}&gp=${round}&session=r`).then((response) => response.json()).then((content) => {
       let dtemp: { name: string, dnumber: number, code: string, laps: { lap: string, laptime: number | null, s1: number | null, s2: number | null, s3: number | null, pitTime: number | null, compound: string, tyreLife: number, status: number, position: number | null, interval: number }[] }[] = [];
       Object.keys(content).forEach(function (key, index) {
         const dx = (data?.filter((d) => d.dnumber == key)[0]) ?? { name: "", code: "" }
@@ -100,9 +97,7 @@ export default function PastStats({ params }: { params: Promise<{ season: string
       })
       setDriverData(dtemp)
     })
-    fetch(`http://100.125.78.96:1234/session/weatherdata?year=${season}&gp=${round}&session=r`).then((response) => response.json()).then((content) => {
-      content = JSON.parse(content.replaceAll("NaN", "null"))
-
+    fetchSessionData(`http://100.125.78.96:1234/session/weatherdata?year=${season}&gp=${round}&session=r`).then((response) => response.json()).then((content) => {
       let tmp: { lap: string, airTemp: number, trackTemp: number, humidity: number, pressure: number, rain: boolean, windSpeed: number, windDir: number }[] = [];
 
       Object.keys(content).forEach(function (key, index)  {
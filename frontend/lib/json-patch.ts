@@ -0,0 +1,31 @@
+export interface PatchOperation {
+  op: "add" | "replace" | "remove";
+  path: string;
+  value?: unknown;
+}
+
+function unescapeKey(key: string) {
+  return key.replaceAll("~1", "/").replaceAll("~0", "~");
+}
+
+// Applies RFC 6902 operations without mutating the input, copying only the objects along each path
+export function applyPatch<T>(doc: T, ops: PatchOperation[]): T {
+  let root: any = doc;
+  for (const op of ops) {
+    const keys = op.path.split("/").slice(1).map(unescapeKey);
+    root = Array.isArray(root) ? [...root] : { ...root };
+    let target: any = root;
+    for (const key of keys.slice(0, -1)) {
+      const child = target[key];
+      target[key] = Array.isArray(child) ? [...child] : { ...(child ?? {}) };
+      target = target[key];
+    }
+    const last = keys[keys.length - 1];
+    if (op.op === "remove") {
+      delete target[last];
+    } else {
+      target[last] = op.value;
+    }
+  }
+  return root;
+}
@@ -0,0 +1,11 @@
+// Historical /session endpoints answer 202 while the server is still loading the session
+export async function fetchSessionData(url: string, init?: RequestInit): Promise<Response> {
+  for (;;) {
+    const response = await fetch(url, init);
+    if (response.status !== 202) {
+      return response;
+    }
+    const retryAfter = Number(response.headers.get("Retry-After") ?? "2") || 2;
+    await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+  }
+}